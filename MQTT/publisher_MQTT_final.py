@@ -25,9 +25,12 @@
 #  Colaboración técnica: ChatGPT (GPT-5)
 
 # --- Importaciones estándar ---
-import json  # Para serializar los paquetes a formato JSON
-import hashlib  #Para calcular el checksum (verificar integridad)
-from datetime import datetime #Para generar timestamps
+import orjson  # Para serializar los paquetes a formato JSON (C, devuelve bytes UTF-8 compactos)
+import zlib  #Para calcular el checksum CRC-32 (verificar integridad)
+import struct  #Para el formato binario de los paquetes MoCap
+import socket  #Para ajustar el buffer de envío TCP
+import time  #Para generar timestamps (time.time(): segundos UNIX)
+import math  #isfinite() para la codificación rápida de la pose
 from enum import Enum  #Para definir enumeraciones
 
 # --- Cliente MQTT (paho-mqtt) ---
@@ -45,7 +48,39 @@ mocap_data = np.empty([100, 7])
 BROKER = "192.168.50.200" #IP del broker MQTT (en este caso, el servidor del Robotat)
 PORT   = 1880  #Puerto asignado para las comunicaciones MQTT
 TOPIC  = "mocap/all"  #Topic en el cual se publicarán los datos del Mocap
-QOS    = 0  #Calidad de servicio (QOS = 0 "at most once")
+QOS    = 0  #Calidad de servicio (QOS = 0 "at most once"; no subirlo para MoCap)
+
+# === Buffers del cliente (tolerancia a ráfagas de frames) ===
+SOCKET_SNDBUF = 256 * 1024  #Bytes del buffer de envío TCP (SO_SNDBUF)
+MAX_INFLIGHT  = 100  #Mensajes QoS>0 sin confirmar a la vez
+MAX_QUEUED    = 1000  #Mensajes en la cola de salida de Paho (0 = sin límite)
+
+# === Formato de los paquetes MoCap ===
+# "json":   paquete JSON en TOPIC (formato de siempre, ~200 bytes).
+# "binary": paquete binario de tamaño fijo en BINARY_TOPIC (46 bytes, ver MOCAP_BODY).
+WIRE_FORMAT  = "json"
+BINARY_TOPIC = "mocap/bin"  #Topic de los paquetes binarios
+
+# Paquete binario (little-endian), mismos campos que el JSON:
+#   src (u8) | pts (f64) | ptp (u8) | pid (u16) | psb (u16) |
+#   x y z qx qy qz qw (7 × f32) | cks (u32, CRC-32 de todo lo anterior)
+MOCAP_BODY = struct.Struct("<BdBHH7f")   #Todo menos el checksum (42 bytes)
+MOCAP_PAYLOAD_SIZE = 7 * 4               #psb: tamaño de la pose (7 floats de 4 bytes)
+
+# === Un paquete por frame (solo formato "json") ===
+# False: un paquete por cuerpo rígido en TOPIC (formato de siempre).
+# True:  un solo paquete por frame NatNet en FRAME_TOPIC, con todos los cuerpos:
+#        pld = {"bodies": [{"pid": id, "pose": {...}}, ...]} y pid = MOCAP_FRAME (300).
+BATCH_FRAMES = False
+FRAME_TOPIC  = "mocap/frame"  #Topic de los paquetes por frame
+
+# === Codificación de la pose (solo formato "json") ===
+# False: la pose se serializa con orjson (precisión completa de cada float).
+# True:  la pose se escribe con una plantilla de texto fija (6 decimales), sin
+#        diccionarios intermedios. Mismo esquema JSON; el checksum se calcula
+#        sobre los bytes enviados, así que el receptor no cambia. Si algún valor
+#        es NaN o infinito se usa orjson (que escribe null), porque "nan" no es JSON.
+FAST_ENCODE  = False
 
 # ===============================================================
 # ENUMERACIONES
@@ -186,9 +221,21 @@ class PacketID(Enum):
     RGT_RELEASE = 108
 
     # --- Para paquetes MOCAP ---
-    # En lugar de escribir los 99 manualmente, se generan dinámicamente:
-    # Esto crea atributos MARKER_01 a MARKER_99 con valores consecutivos
-    pass
+    # En lugar de escribir los 99 manualmente, se generan justo después de la
+    # clase (ver abajo): MARKER_01 a MARKER_99 con valores consecutivos 201–299.
+    MOCAP_FRAME = 300   # Paquete por frame (BATCH_FRAMES): cada cuerpo lleva su pid en pld
+
+
+# Se reconstruye PacketID una sola vez al importar, con los miembros anteriores
+# más MARKER_01..MARKER_99. Los valores empiezan en 201 para no chocar con los
+# IDs de DATA (0–2), de COMMAND (100–108) ni con MOCAP_FRAME (300), que los
+# convertirían en alias.
+PacketID = Enum(
+    "PacketID",
+    [(m.name, m.value) for m in PacketID]
+    + [(f"MARKER_{i:02d}", 200 + i) for i in range(1, 100)],
+    module=__name__,
+)
 
 
 
@@ -196,17 +243,37 @@ class PacketID(Enum):
 _mqtt = None   #Instancia global del clilente MQTT
 CURRENT_SOURCE = Source.ROBOTAT_SERVER  # Valor por defecto
 
+# Valores de los Enum que se usan en cada frame. .value pasa por un descriptor en
+# cada acceso, así que se leen una sola vez; _init_mqtt actualiza _SRC_V.
+_SRC_V = CURRENT_SOURCE.value
+_PTP_MOCAP = PacketType.MOCAP.value
+
 # ===============================================================
 # FUNCIÓN: Inicialización del cliente MQTT
 # ===============================================================
 
+def _on_socket_open(client, userdata, sock):
+    """
+    Amplía el buffer de envío TCP para absorber ráfagas de frames MoCap y desactiva
+    Nagle (TCP_NODELAY) para que cada paquete pequeño salga sin esperar al siguiente.
+    """
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SNDBUF)
+    except OSError as e:
+        print(f"[MQTT] No se pudo ajustar SO_SNDBUF: {e}")
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError as e:
+        print(f"[MQTT] No se pudo activar TCP_NODELAY: {e}")
+
+
 def _init_mqtt(node_source: Source = Source.ROBOTAT_SERVER):
     """
     Inicializa el cliente MQTT e indica la fuente de los paquetes. 
     Si el cliente ya estaba inicializado, evita duplicar la conexión. 
     Por defecto, se asume que es el servidor del Robotat.
     """
-    global _mqtt, CURRENT_SOURCE
+    global _mqtt, CURRENT_SOURCE, _SRC_V
 
     # Si ya está inicializado, no volver a crear el cliente
     if _mqtt is not None:
@@ -214,9 +281,13 @@ def _init_mqtt(node_source: Source = Source.ROBOTAT_SERVER):
 
     # Guarda el source actual para los paquetes
     CURRENT_SOURCE = node_source
+    _SRC_V = node_source.value
 
     # Crea y conecta el cliente MQTT
     client = mqtt.Client()
+    client.on_socket_open = _on_socket_open  #Ajusta SO_SNDBUF en cada (re)conexión
+    client.max_inflight_messages_set(MAX_INFLIGHT)
+    client.max_queued_messages_set(MAX_QUEUED)
     client.connect(BROKER, PORT, keepalive=60)
     client.loop_start()  #Inicial el loop en segundo plano
 
@@ -227,30 +298,76 @@ def _init_mqtt(node_source: Source = Source.ROBOTAT_SERVER):
 # FUNCIÓN: Calcular Checksum
 # ===============================================================
 
-def _calculate_checksum(packet_dict: dict) -> str:
-    """Calcula el checksum del paquete (excluyendo el propio campo 'cks')."""
-    
-    #Se crea una copia del paquete sin incluir el checksum 
-    temp_packet = {k: v for k, v in packet_dict.items() if k != "cks"}
-    # Se convierte el diccionario a bytes JSON ordenados
-    json_bytes = json.dumps(temp_packet, separators=(',', ':'), ensure_ascii=False).encode("utf-8")
-    # Se retorna el hash en formato hexadecimal
-    return hashlib.sha256(json_bytes).hexdigest()
+def _calculate_checksum(body: bytes) -> str:
+    """Calcula el checksum sobre los bytes JSON del paquete (sin el campo 'cks')."""
+    # El checksum solo verifica la integridad del transporte en la LAN (no es de
+    # seguridad): CRC-32 es mucho más barato que SHA-256 para paquetes de ~200 bytes.
+    # Se retorna en formato hexadecimal de 8 caracteres
+    return f"{zlib.crc32(body):08x}"
 
 # ===============================================================
 # FUNCIÓN: Publicar paquete en MQTT
 # ===============================================================
-#Serializa el paquete en formato JSON y lo publica en el topic MQTT
+#Serializa el paquete en formato JSON y lo publica en el topic MQTT.
+#orjson produce directamente bytes UTF-8 compactos (equivale a separators=(',', ':')
+#y ensure_ascii=False). El payload ("pld") llega ya serializado (se usó para
+#calcular "psb") y se agrega tal cual después de los campos del encabezado; luego
+#el checksum se calcula sobre esos bytes y se agrega al final del objeto JSON.
+#El resultado es el mismo JSON de siempre: src, pts, ptp, pid, psb, pld, cks.
+
+def _publish_packet(packet: dict, pld: bytes, topic: str = TOPIC):
+    body = orjson.dumps(packet)[:-1] + b',"pld":' + pld + b'}'
+    cks = _calculate_checksum(body)
+    payload_out = body[:-1] + b',"cks":"' + cks.encode("ascii") + b'"}'
+    _mqtt.publish(topic, payload_out, qos=QOS, retain=False)
 
-def _publish_packet(packet: dict):
-    payload_out = json.dumps(packet, separators=(',', ':'), ensure_ascii=False)
-    _mqtt.publish(TOPIC, payload_out, qos=QOS, retain=False)
+# ===============================================================
+# FUNCIÓN: Publicar paquete binario en MQTT
+# ===============================================================
+#Empaqueta la pose con MOCAP_BODY (sin JSON ni diccionarios) y agrega el CRC-32
+#de esos bytes al final.
+
+def _publish_binary(id, position, rotation):
+    body = MOCAP_BODY.pack(
+        _SRC_V, _frame_timestamp(), _PTP_MOCAP,
+        int(id), MOCAP_PAYLOAD_SIZE,
+        position[0], position[1], position[2],
+        rotation[0], rotation[1], rotation[2], rotation[3],
+    )
+    payload_out = body + zlib.crc32(body).to_bytes(4, "little")
+    _mqtt.publish(BINARY_TOPIC, payload_out, qos=QOS, retain=False)
 
 # ===============================================================
 # FUNCIONES CALLBACK DEL SISTEMA MOCAP
 # ===============================================================
+# Timestamp del frame NatNet en curso. NatNet llama a on_rigid_body por cada cuerpo
+# y a receive_new_frame al final del frame, así que el primer cuerpo de cada frame
+# toma la hora y los demás la reutilizan; receive_new_frame la borra para el siguiente.
+_frame_ts = None
+
+# Cuerpos del frame en curso (BATCH_FRAMES): bytes JSON {"pid":id,"pose":{...}}
+_frame_bodies = []
+
+# Encabezado del paquete por frame (se reutiliza). pid = MOCAP_FRAME, propio de
+# este paquete: cada cuerpo lleva su pid en pld y 0 se confundiría con STATE.
+_FRAME_PACKET = {"src": 0, "pts": 0.0, "ptp": 0, "pid": PacketID.MOCAP_FRAME.value, "psb": 0}
+
+def _publish_frame():
+    """Publica en FRAME_TOPIC todos los cuerpos acumulados del frame y vacía la lista."""
+    pld = b'{"bodies":[' + b','.join(_frame_bodies) + b']}'
+    _frame_bodies.clear()
+    _FRAME_PACKET["src"] = _SRC_V
+    _FRAME_PACKET["pts"] = _frame_timestamp()
+    _FRAME_PACKET["ptp"] = _PTP_MOCAP
+    _FRAME_PACKET["psb"] = len(pld)
+    _publish_packet(_FRAME_PACKET, pld, FRAME_TOPIC)
+
 def receive_new_frame(data_dict):
-    pass
+    global _frame_ts
+    # Fin del frame: si se están agrupando cuerpos, se publica el paquete del frame
+    if _frame_bodies:
+        _publish_frame()
+    _frame_ts = None
     # order_list=[ "frameNumber", "markerSetCount", "unlabeledMarkersCount", "rigidBodyCount", "skeletonCount",
     #              "labeledMarkerCount", "timecode", "timecodeSub", "timestamp", "isRecording", "trackedModelsChanged" ]
     # dump_args = False
@@ -266,16 +383,52 @@ def receive_new_frame(data_dict):
 
 def receive_rigid_body_frame(id, position, rotation):
     #print("ID: " + str(id) + " position: [" + str(position[0]) + ", " + str(position[1]) + ", " + str(position[2]) + "]")
-    mocap_data[id, 0] = position[0];
-    mocap_data[id, 1] = position[1];
-    mocap_data[id, 2] = position[2];
-    mocap_data[id, 3] = rotation[3];
-    mocap_data[id, 4] = rotation[0];
-    mocap_data[id, 5] = rotation[1];
-    mocap_data[id, 6] = rotation[2];
+    # Una sola asignación de fila (una llamada a numpy) en lugar de 7 escrituras
+    # escalares. Orden de columnas: x, y, z, qw, qx, qy, qz.
+    mocap_data[id] = (position[0], position[1], position[2],
+                      rotation[3], rotation[0], rotation[1], rotation[2])
    
 
 
+def _frame_timestamp():
+    """Timestamp UNIX del frame en curso (se calcula con el primer cuerpo del frame)."""
+    global _frame_ts
+    if _frame_ts is None:
+        _frame_ts = time.time()
+    return _frame_ts
+
+
+# ===============================================================
+#  PLANTILLAS DE PAQUETE POR CUERPO RÍGIDO
+# ===============================================================
+# Cada cuerpo rígido publica el mismo esquema en cada frame. En lugar de crear
+# ~10 diccionarios anidados por frame, se crea uno por id la primera vez y luego
+# solo se actualizan sus valores. Es seguro porque NatNet llama a on_rigid_body
+# desde un único hilo y el paquete se serializa antes del siguiente frame.
+# El orden de las claves es el mismo de siempre (el checksum depende de él).
+
+_TEMPLATES = {}   # id → (packet, pose_payload, position, rotation)
+
+def _template(id):
+    tmpl = _TEMPLATES.get(id)
+    if tmpl is None:
+        position = {"x": 0.0, "y": 0.0, "z": 0.0}
+        rotation = {"qx": 0.0, "qy": 0.0, "qz": 0.0, "qw": 0.0}
+        pose_payload = {"pose": {"position": position, "rotation": rotation}}
+        packet = {
+            "src": _SRC_V,                                         # Fuente (Enum)
+            #"src": Source.POLOLU_03.value,
+            #"src": Source.USER_PC.value, 
+            "pts": 0.0,                                            # Timestamp UNIX
+            "ptp": _PTP_MOCAP,                                     # Tipo de paquete (Enum)
+            "pid": int(id),                                        # ID
+            "psb": 0,                                              # Tamaño del payload
+            # "pld" (payload) se agrega ya serializado en _publish_packet
+        }
+        tmpl = _TEMPLATES[id] = (packet, pose_payload, position, rotation)
+    return tmpl
+
+
 # ===============================================================
 #  PUBLICA LA POSE DE UN CUERPO RÍGIDO
 # ===============================================================
@@ -292,41 +445,54 @@ def on_rigid_body(id, position, rotation):
     #Procesa la información cruda recibida desde NatNet
     receive_rigid_body_frame(id, position, rotation)
 
-    # ---- Construcción de pose_payload ----
-    pose_payload = {}
-    pose_payload["pose"] = {}
-    pose_payload["pose"]["position"] = {}
-    pose_payload["pose"]["position"]["x"] = float(position[0])
-    pose_payload["pose"]["position"]["y"] = float(position[1])
-    pose_payload["pose"]["position"]["z"] = float(position[2])
-    pose_payload["pose"]["rotation"] = {}
-    pose_payload["pose"]["rotation"]["qx"] = float(rotation[0])
-    pose_payload["pose"]["rotation"]["qy"] = float(rotation[1])
-    pose_payload["pose"]["rotation"]["qz"] = float(rotation[2])
-    pose_payload["pose"]["rotation"]["qw"] = float(rotation[3])
-
-    # ---- Cálculo tamaño del payload ----
-    payload_json = json.dumps(pose_payload, separators=(',', ':'), ensure_ascii=False)
-    payload_size_bytes = len(payload_json.encode("utf-8"))
+    #Formato binario: se publica directamente, sin construir el paquete JSON
+    if WIRE_FORMAT == "binary":
+        _publish_binary(id, position, rotation)
+        return
+
+    # ---- Plantilla del paquete para este id (se reutiliza en cada frame) ----
+    packet, pose_payload, pos, rot = _template(id)
+
+    # Una sola comprobación para los 7 valores: NaN/inf se propagan a la suma (un
+    # desbordamiento con valores finitos enormes solo hace usar el camino orjson)
+    if FAST_ENCODE and math.isfinite(position[0] + position[1] + position[2] + rotation[0]
+                                     + rotation[1] + rotation[2] + rotation[3]):
+        # ---- Pose escrita directamente con la plantilla de texto ----
+        pose_bytes = (
+            f'{{"pose":{{"position":{{"x":{position[0]:.6f},"y":{position[1]:.6f},"z":{position[2]:.6f}}},'
+            f'"rotation":{{"qx":{rotation[0]:.6f},"qy":{rotation[1]:.6f},"qz":{rotation[2]:.6f},"qw":{rotation[3]:.6f}}}}}}}'
+        ).encode("ascii")
+    else:
+        # ---- Actualización de pose_payload (en el mismo diccionario) ----
+        pos["x"] = float(position[0])
+        pos["y"] = float(position[1])
+        pos["z"] = float(position[2])
+        rot["qx"] = float(rotation[0])
+        rot["qy"] = float(rotation[1])
+        rot["qz"] = float(rotation[2])
+        rot["qw"] = float(rotation[3])
+
+        # ---- Serialización del payload (una sola vez) ----
+        pose_bytes = orjson.dumps(pose_payload)
+
+    # ---- Tamaño del payload ----
+    payload_size_bytes = len(pose_bytes)
+
+    # ---- Un paquete por frame: solo se acumula; receive_new_frame lo publica ----
+    if BATCH_FRAMES:
+        _frame_timestamp()                                         # Fija el timestamp del frame
+        _frame_bodies.append(b'{"pid":%d,' % int(id) + pose_bytes[1:])
+        return
 
     # ---- Paquete final ----
-    packet = {
-        "src": CURRENT_SOURCE.value,                         # Fuente (Enum)
-        #"src": Source.POLOLU_03.value,
-        #"src": Source.USER_PC.value, 
-        "pts": datetime.utcnow().timestamp(),                      # Timestamp UNIX
-        "ptp": PacketType.MOCAP.value,                              # Tipo de paquete (Enum)
-        "pid": int(id),  # ID
-        "psb": payload_size_bytes,                                 # Tamaño del payload
-        "pld": pose_payload,                                       # Payload (pose)
-        "cks": None                                                # Checksum 
-    }
-
-    # ---- Calcular y asignar checksum ----
-    packet["cks"] = _calculate_checksum(packet)
-
-    # ---- Publicar en MQTT ----
-    _publish_packet(packet)
+    packet["src"] = _SRC_V                                         # Fuente (Enum)
+    packet["pts"] = _frame_timestamp()                             # Timestamp UNIX (uno por frame)
+    packet["psb"] = payload_size_bytes                             # Tamaño del payload
+    # "ptp" y "pid" ya están en la plantilla; "pld" (pose_bytes) y "cks" (checksum)
+    # los agrega _publish_packet sobre los bytes ya serializados
+
+    # ---- Calcular checksum y publicar en MQTT ----
+    _publish_packet(packet, pose_bytes)
 
 
 # ===============================================================
@@ -22,9 +22,11 @@
 
 from flask import Flask, Response, jsonify # Flask: framework web liviano para crear el microservidor
 from video_stream import VideoCamera   # Clase que gestiona el flujo RTSP de cada cámara
+from video_stream import MJPEG_PART_HEADER, MJPEG_PART_END  # Cabecera/cierre constantes de cada parte MJPEG
 from config import CAMERAS  # Diccionario con la configuración de cámaras (IP, usuario, RTSP, etc.)
 import threading  # Permite crear hilos independientes por cámara
-import time  # Se usa para controlar la tasa de refresh y pausas breves
+import os  # Para conocer el número de núcleos disponibles
+import json  # Para serializar el resumen de /status una sola vez
 
 # ------------------------------------------------------------
 # Inicializa la aplicación Flask
@@ -34,6 +36,29 @@ app = Flask(__name__)   # Crea la instancia principal de la aplicación Flask
 # Diccionarios globales con las cámaras activas y sus locks
 cameras = {}  # Almacena los objetos VideoCamera activos por ID de cámara
 camera_locks = {}  # Almacena Locks por cámara para acceso seguro a frames
+# Lock global para crear/eliminar cámaras de forma atómica (evita que dos peticiones
+# simultáneas abran dos veces el mismo RTSP y lancen hilos de captura duplicados)
+_init_lock = threading.Lock()
+
+# Hilos de decodificación FFmpeg por cámara: se reparten los núcleos entre las cámaras
+# configuradas para que ninguna acapare la CPU cuando todas están activas.
+DECODE_THREADS = max(1, (os.cpu_count() or 1) // max(1, len(CAMERAS)))
+
+# Respuesta de /status ya serializada (bytes JSON). Solo se recalcula cuando una
+# cámara se inicia o se detiene, no en cada consulta de monitoreo.
+_status_lock = threading.Lock()
+_status_json = b"{}"
+
+
+def _refresh_status():
+    """Recalcula el JSON cacheado de /status a partir de las cámaras activas."""
+    global _status_json
+    with _status_lock:
+        snapshot = {
+            cid: {"active": cam.running, "url": CAMERAS[cid]["ip"]}
+            for cid, cam in cameras.items()  # Recorre todas las cámaras activas
+        }
+        _status_json = json.dumps(snapshot).encode("utf-8")
 
 # ============================================================
 # Función: generate_stream(cam_id)
@@ -43,17 +68,28 @@ camera_locks = {}  # Almacena Locks por cámara para acceso seguro a frames
 # para ser mostradas en un navegador o interfaz que soporte streaming.
 # ============================================================
 def generate_stream(cam_id):
-    """Genera un flujo MJPEG estable (~30 FPS) para la cámara solicitada."""
+    """Genera un flujo MJPEG para la cámara solicitada, al ritmo real de la cámara."""
      # Obtiene el objeto VideoCamera correspondiente al ID solicitado
     cam = cameras.get(cam_id)
     # Obtiene el Lock asociado a esa cámara (para acceso seguro)
     lock = camera_locks.get(cam_id)
 
     print(f"Iniciando stream MJPEG estable para cámara {cam_id}")
+    seq = 0  # Número de secuencia del último frame enviado a este cliente
 
     try:
-        # Bucle infinito mientras el cliente mantenga la conexión abierta
-        while True:
+        # Bucle mientras el cliente mantenga la conexión abierta y la cámara siga activa
+        while cam.running:
+            # ------------------------------------------------------------
+            # Espera a que el hilo de captura publique un frame nuevo
+            # (reemplaza el sondeo con time.sleep: cada cliente despierta
+            # una vez por frame real y nunca reenvía el mismo frame)
+            # ------------------------------------------------------------
+            new_seq = cam.wait_frame(seq)
+            if new_seq == seq:
+                continue  # Timeout sin frame nuevo → vuelve a esperar
+            seq = new_seq
+
             # ------------------------------------------------------------
             # Captura el frame actual de manera segura usando el Lock
             # (esto evita que otro hilo modifique el frame mientras se lee)
@@ -63,21 +99,17 @@ def generate_stream(cam_id):
 
             # Si todavía no hay frame disponible (la cámara acaba de iniciar)
             if frame is None:
-                # Si aún no hay frame, espera breve y continúa
-                time.sleep(0.03)
                 continue
 
             # ------------------------------------------------------------
             # Construye la respuesta HTTP tipo multipart/x-mixed-replace
-            # Cada bloque representa un frame JPEG independiente
+            # Cada bloque representa un frame JPEG independiente.
+            # Se envía en tres trozos (cabecera, JPEG, CRLF) para que Waitress
+            # escriba los bytes cacheados sin copiarlos a un bloque concatenado.
             # ------------------------------------------------------------
-            yield (
-                b"--frame\r\n"  # Separador entre frames
-                b"Content-Type: image/jpeg\r\n\r\n" + frame + b"\r\n" # Especifica tipo de contenido
-            )
-
-            # Control de tasa de actualización (~30 FPS)
-            time.sleep(0.03)
+            yield MJPEG_PART_HEADER % len(frame)  # Separador entre frames + tipo y tamaño del contenido
+            yield frame
+            yield MJPEG_PART_END
 
     except GeneratorExit:
         # Este bloque se ejecuta automáticamente cuando el cliente (por ejemplo, un navegador)
@@ -105,15 +137,22 @@ def stream_camera(cam_id):
         return jsonify({"error": "Cámara no encontrada"}), 404
 
     # Si la cámara aún no tiene hilo activo → se inicializa
-    if cam_id not in cameras:
-        rtsp_url = CAMERAS[cam_id]["rtsp"] # Obtiene la URL RTSP desde el archivo config.py
-        print(f" Conectando cámara {cam_id}: {rtsp_url}") 
-        cam = VideoCamera(rtsp_url)  # Crea el objeto VideoCamera asociado al flujo RTSP
-        cam.start()  # Inicia el hilo interno que mantiene la conexión RTSP
+    # (se vuelve a comprobar dentro del lock por si otra petición la creó primero)
+    with _init_lock:
+        if cam_id not in cameras:
+            rtsp_url = CAMERAS[cam_id]["rtsp"] # Obtiene la URL RTSP desde el archivo config.py
+            print(f" Conectando cámara {cam_id}: {rtsp_url}") 
+            cam = VideoCamera(                                           # Crea el objeto VideoCamera asociado al flujo RTSP
+                rtsp_url,
+                decode_threads=DECODE_THREADS,
+                cpu_core=CAMERAS[cam_id].get("cpu_core"),                # Núcleo fijo opcional (ver config.py)
+            )
+            cam.start()  # Inicia el hilo interno que mantiene la conexión RTSP
 
-        # Guarda la instancia activa y su Lock asociado en los diccionarios globales
-        cameras[cam_id] = cam
-        camera_locks[cam_id] = threading.Lock()
+            # Guarda la instancia activa y su Lock asociado en los diccionarios globales
+            cameras[cam_id] = cam
+            camera_locks[cam_id] = threading.Lock()
+            _refresh_status()  # Actualiza el resumen cacheado de /status
 
     # ----------------------------------------------------------------
     # Devuelve la respuesta HTTP en formato de streaming MJPEG
@@ -146,11 +185,8 @@ def stream_camera(cam_id):
 @app.route("/status")
 def status():
     """Devuelve un resumen JSON de las cámaras activas y su IP."""
-     # Crea un diccionario con datos resumidos de cada cámara activa
-    return jsonify({
-        cid: {"active": cam.running, "url": CAMERAS[cid]["ip"]} 
-        for cid, cam in cameras.items()  # Recorre todas las cámaras activas
-    })
+    # Devuelve los bytes precalculados en _refresh_status() (sin armar el dict por petición)
+    return Response(_status_json, mimetype="application/json")
 
 
 # ============================================================
@@ -164,13 +200,18 @@ def status():
 @app.route("/stop/<cam_id>")
 def stop_camera(cam_id):
     """Detiene la cámara indicada y libera recursos."""
-    # Si la cámara existe en el diccionario global de cámaras activas
-    # Llama al método stop() de VideoCamera → cierra RTSP y libera memoria
-    if cam_id in cameras:
-        cameras[cam_id].stop()
-         # Elimina sus referencias de los diccionarios globales
-        del cameras[cam_id]
-        del camera_locks[cam_id]
+    # Si la cámara existe en el diccionario global de cámaras activas,
+    # elimina sus referencias de los diccionarios globales (de forma atómica)
+    with _init_lock:
+        cam = cameras.pop(cam_id, None)
+        camera_locks.pop(cam_id, None)
+        if cam is not None:
+            _refresh_status()  # Actualiza el resumen cacheado de /status
+
+    if cam is not None:
+        # Llama al método stop() de VideoCamera → cierra RTSP y libera memoria
+        # (fuera del lock: stop() espera ~0.5 s y no debe bloquear otras cámaras)
+        cam.stop()
         # Devuelve una respuesta JSON confirmando la acción
         return jsonify({"status": f"Cámara {cam_id} detenida"}), 200
     
@@ -198,5 +239,16 @@ if __name__ == "__main__":
     # Inicia el servidor en todas las interfaces de red (0.0.0.0)
     # Esto permite que otros dispositivos dentro de la red local accedan al stream.
     # Puerto configurado en 5000 (puede modificarse si se necesita)
-    serve(app, host="0.0.0.0", port=5000)
+    # Cada cliente MJPEG ocupa un hilo de Waitress mientras dure su stream, así que los
+    # 4 hilos por defecto se agotan con pocos visores. Se amplía el pool y el límite de
+    # conexiones; channel_timeout se deja en su valor por defecto para que los sockets
+    # muertos se sigan limpiando (cleanup_interval).
+    serve(
+        app,
+        host="0.0.0.0",
+        port=5000,
+        threads=32,
+        connection_limit=200,
+        cleanup_interval=30,
+    )
 
@@ -21,5 +21,6 @@ CAMERAS = {
 
     },
     # Si luego se agregan más, copiar y pegar con IDs "3"..."6"
+    # Opcional: "cpu_core": N fija el hilo de captura de esa cámara al núcleo N (solo Linux)
 }
 
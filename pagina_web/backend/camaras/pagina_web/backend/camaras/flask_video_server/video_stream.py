@@ -13,7 +13,7 @@
 #
 # Incluye mecanismos de:
 # - Reconexión automática si se pierde la señal.
-# - Control de frecuencia (FPS).
+# - Entrega de frames guiada por la cámara (sin sondeo con sleep).
 # - Reducción de latencia mediante buffer mínimo.
 # - Acceso concurrente seguro con locks.
 # ============================================================
@@ -24,10 +24,60 @@
 # ------------------------------------------------------------
 # Importación de bibliotecas necesarias
 # ------------------------------------------------------------
+import os        # Variables de entorno de FFmpeg y afinidad de CPU (opcional)
+
+# Opciones de FFmpeg para RTSP (deben existir antes de abrir cualquier VideoCapture):
+# - rtsp_transport=tcp: los paquetes RTP perdidos se retransmiten en vez de corromper
+#   frames y forzar reconexiones, como ocurre con UDP en la red del laboratorio.
+# - fflags=nobuffer / flags=low_delay: evita las colas internas de FFmpeg (~0.5 s de retraso).
+# setdefault permite sobrescribirlas desde el entorno si hiciera falta.
+os.environ.setdefault(
+    "OPENCV_FFMPEG_CAPTURE_OPTIONS",
+    "rtsp_transport;tcp|fflags;nobuffer|flags;low_delay",
+)
+
 import cv2  # Biblioteca OpenCV: permite capturar y procesar video
 import threading  # Para ejecutar la captura en un hilo independiente
 import time      # Para manejar pausas, tiempos y reconexiones
 
+# Segundos sin frames tras los cuales ensure_alive() considera caído el RTSP
+ALIVE_TIMEOUT = 5
+
+# Tiempos máximos (ms) para abrir el RTSP y para cada lectura; evitan que un
+# open()/read() quede bloqueado indefinidamente si la cámara deja de responder
+OPEN_TIMEOUT_MS = 5000
+READ_TIMEOUT_MS = 3000
+
+# Tamaño máximo (ancho, alto) de los frames que se transmiten
+FRAME_SIZE = (960, 540)
+
+# Parámetros de codificación JPEG (se construyen una sola vez, no por frame).
+# Nota: no se reciclan buffers (bytearray) entre frames. Waitress puede seguir enviando
+# los bytes de un frame a un cliente lento mientras llega el siguiente, así que cada
+# frame debe ser un objeto bytes inmutable propio.
+# Se fija explícitamente el submuestreo 4:2:0 (el más barato de codificar y el que
+# usan las rutas SIMD de libjpeg-turbo, que ya viene incluido en las ruedas de opencv-python).
+_JPEG_PARAMS = [
+    cv2.IMWRITE_JPEG_QUALITY, 75,
+    cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+]
+# Parámetros de respaldo con menor calidad, usados mientras el hilo de captura
+# no alcanza a procesar los frames al ritmo de la cámara (ver _update)
+_JPEG_PARAMS_LOW = [
+    cv2.IMWRITE_JPEG_QUALITY, 50,
+    cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+]
+# Frames lentos por segundo a partir de los cuales se baja la calidad
+SLOW_FRAMES_LIMIT = 5
+
+# Cabecera de cada parte multipart/x-mixed-replace (plantilla, se arma una sola vez).
+# Incluye Content-Length para que el cliente lea el JPEG completo de una vez en lugar
+# de buscar el siguiente "--frame" byte a byte.
+# El frame se envía en trozos separados (cabecera, JPEG, CRLF) para no concatenar
+# y copiar los ~40 KB del JPEG en cada yield.
+MJPEG_PART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n"
+MJPEG_PART_END = b"\r\n"
+
 # ============================================================
 # Clase principal: VideoCamera
 # ============================================================
@@ -37,14 +87,22 @@ class VideoCamera:
     Permite reconexión automática y acceso seguro al frame más reciente.
     """
 
-    def __init__(self, rtsp_url):
+    def __init__(self, rtsp_url, decode_threads=0, cpu_core=None):
         self.rtsp_url = rtsp_url       # Guarda la URL RTSP (dirección de flujo de la cámara)       
-        self.frame = None                     # Almacena último frame recibido
+        self.decode_threads = decode_threads  # Hilos de decodificación H.264 de FFmpeg (0 = automático)
+        self.cpu_core = cpu_core              # Núcleo fijo para el hilo de captura (None = libre)
+        self.jpeg_bytes = None                # Último frame ya codificado en JPEG (compartido por todos los clientes)
         self.running = False                  # Bandera que indica si el hilo de captura está activo o no
         self.lock = threading.Lock()          # Lock para para evitar conflictos entre hilos al acceder al frame
         self.thread = None                    # Referencia al hilo que ejecuta la captura
         self.cap = None                       # Objeto VideoCapture de OpenCV encargado de leer el flujo RTSP
         self.last_frame_time = 0              # Tiempo del último frame válido
+        # Condición asociada al lock: despierta a los generadores cuando llega un frame nuevo.
+        # Se usa un número de secuencia (y no un Event compartido) para que varios clientes
+        # puedan esperar el mismo frame sin "robarse" la señal entre ellos al hacer clear().
+        self.frame_cond = threading.Condition(self.lock)
+        self.frame_seq = 0                    # Contador de frames recibidos (aumenta con cada frame nuevo)
+        self.jpeg_params = _JPEG_PARAMS       # Parámetros JPEG en uso (calidad adaptativa)
 
     # ------------------------------------------------------------
     def start(self):
@@ -64,8 +122,18 @@ class VideoCamera:
     # ------------------------------------------------------------
     def _open_stream(self):
         """Intenta abrir la conexión RTSP y configurar el buffer."""
-        # Abre la transmisión RTSP usando el backend FFMPEG de OpenCV
-        cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG)
+        # Abre la transmisión RTSP usando el backend FFMPEG de OpenCV.
+        # CAP_PROP_N_THREADS solo se puede fijar al abrir: reparte la decodificación
+        # H.264 de FFmpeg entre varios hilos (por frames/slices) en lugar de uno solo.
+        cap = cv2.VideoCapture(
+            self.rtsp_url,
+            cv2.CAP_FFMPEG,
+            [
+                cv2.CAP_PROP_N_THREADS, self.decode_threads,
+                cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, OPEN_TIMEOUT_MS,
+                cv2.CAP_PROP_READ_TIMEOUT_MSEC, READ_TIMEOUT_MS,
+            ],
+        )
 
         # Si la conexión se abre correctamente:
         if cap.isOpened():
@@ -77,6 +145,16 @@ class VideoCamera:
     def _update(self):
         """Hilo principal que mantiene el flujo RTSP activo."""
         reconnect_attempts = 0 # Contador de intentos de reconexión
+
+        # Afinidad de CPU opcional (solo Linux): en Linux la afinidad es por hilo, así que
+        # fija únicamente este hilo de captura a su núcleo y conserva la caché entre frames.
+        # Ojo: los hilos de decodificación que FFmpeg cree desde aquí heredan la afinidad,
+        # por eso solo se activa si la cámara define "cpu_core" en config.py.
+        if self.cpu_core is not None and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, {self.cpu_core % (os.cpu_count() or 1)})
+            except OSError as e:
+                print(f"No se pudo fijar la afinidad de CPU para {self.rtsp_url}: {e}")
         
         # Bucle principal de captura, activo mientras self.running sea True
         while self.running:
@@ -94,6 +172,13 @@ class VideoCamera:
              # Si la conexión se logra, reinicia el contador
             reconnect_attempts = 0
 
+            # Presupuesto de tiempo por frame según los FPS que reporta la cámara
+            # (si no los reporta o son absurdos se asume 25 FPS)
+            fps = self.cap.get(cv2.CAP_PROP_FPS) or 0
+            frame_budget = 1.0 / fps if 1 <= fps <= 120 else 1.0 / 25
+            slow_frames = 0                        # Frames que tardaron más que el presupuesto
+            window_start = time.monotonic()        # Inicio de la ventana de 1 s
+
             # Bucle interno que lee frames mientras la cámara esté abierta
             while self.running and self.cap.isOpened():
                 # Lee un frame del flujo RTSP
@@ -111,16 +196,42 @@ class VideoCamera:
 
                 # Guarda el timestamp del último frame válido
                 self.last_frame_time = time.time()
+                t0 = time.monotonic()  # Inicio del procesamiento de este frame
+
+                # Redimensiona para transmisión más ligera, solo si el frame es más grande
+                # que FRAME_SIZE. El substream (subtype=1) ya llega con menor resolución:
+                # en ese caso se evita un re-muestreo completo (y un escalado hacia arriba).
+                h, w = frame.shape[:2]
+                if w > FRAME_SIZE[0] or h > FRAME_SIZE[1]:
+                    frame = cv2.resize(frame, FRAME_SIZE, interpolation=cv2.INTER_AREA)
+
+                # Codifica el frame a JPEG una sola vez aquí (no por cada cliente).
+                jpeg = self._encode_jpeg(frame)
+                if jpeg is None:
+                    continue
 
-                # Redimensiona para transmisión más ligera 
-                frame = cv2.resize(frame, (960, 540))
-
-                # Guarda el frame de forma segura
+                # Guarda los bytes de forma segura y notifica a los clientes en espera.
+                # El ndarray BGR no se conserva: solo se guardan los bytes JPEG.
                 with self.lock:
-                    self.frame = frame
-
-                # Controla la frecuencia (~20 fps)
-                time.sleep(0.05)
+                    self.jpeg_bytes = jpeg
+                    self.frame_seq += 1
+                    self.frame_cond.notify_all()
+
+                # Calidad adaptativa: si en el último segundo varios frames tardaron más que
+                # el presupuesto, el hilo se está quedando atrás → se codifica con calidad 50
+                # hasta que se recupere (menos CPU y menos bytes por cliente).
+                now = time.monotonic()
+                if now - t0 > frame_budget:
+                    slow_frames += 1
+                if now - window_start >= 1.0:
+                    self.jpeg_params = _JPEG_PARAMS_LOW if slow_frames >= SLOW_FRAMES_LIMIT else _JPEG_PARAMS
+                    slow_frames = 0
+                    window_start = now
+
+                # Sin pausa artificial: cap.read() ya bloquea hasta el siguiente frame,
+                # así que el ritmo lo marca la cámara. Si el hilo se retrasa, el frame
+                # anterior simplemente se sobrescribe (solo se conserva el más reciente)
+                # y el buffer de FFmpeg no se llena de frames viejos.
 
             # Fin del bucle interno → cerrar y reconectar
             self.cap.release()
@@ -129,26 +240,46 @@ class VideoCamera:
 
         print(f"Hilo de cámara detenido: {self.rtsp_url}")
 
+    # ------------------------------------------------------------
+    def _encode_jpeg(self, frame):
+        """
+        Codifica un frame BGR a JPEG y devuelve los bytes (o None si falla).
+
+        Es el único punto de codificación del módulo. Se usa libjpeg de OpenCV en CPU:
+        OpenCV no expone codificadores JPEG por hardware (NVJPEG/QSV/VAAPI) y, a 960x540,
+        imencode tarda pocos milisegundos y libera el GIL. Si se instala un equipo con
+        codificador por hardware, basta con reemplazar este método.
+        """
+        ok, buf = cv2.imencode(".jpg", frame, self.jpeg_params)
+        return buf.tobytes() if ok else None
+
     # ------------------------------------------------------------
     def get_jpeg_frame(self):
         """Devuelve el último frame codificado como JPEG o None."""
-        # Acceso protegido con lock (otro hilo podría estar escribiendo el frame)
+        # Acceso protegido con lock (otro hilo podría estar escribiendo el frame).
+        # La codificación ya se hizo en _update, aquí solo se devuelven los bytes cacheados.
         with self.lock:
-            if self.frame is None:
-                return None
+            return self.jpeg_bytes
 
-             # Codifica el frame (matriz de OpenCV) a formato JPEG
-            ret, jpeg = cv2.imencode(".jpg", self.frame, [cv2.IMWRITE_JPEG_QUALITY, 75])
-            if not ret:
-                return None
-            # Devuelve el frame como secuencia de bytes
-            return jpeg.tobytes()
+    # ------------------------------------------------------------
+    def wait_frame(self, last_seq, timeout=1.0):
+        """
+        Bloquea hasta que exista un frame más reciente que last_seq (o hasta timeout).
+        Devuelve el número de secuencia actual; si es igual a last_seq no hubo frame nuevo.
+        """
+        with self.frame_cond:
+            # También despierta si la cámara se detiene, para no dejar clientes colgados
+            self.frame_cond.wait_for(lambda: self.frame_seq != last_seq or not self.running, timeout)
+            return self.frame_seq
 
     # ------------------------------------------------------------
     def stop(self):
         """Detiene la lectura de la cámara y libera recursos."""
         print(f" Deteniendo cámara: {self.rtsp_url}")
         self.running = False # Desactiva la bandera de ejecución
+        # Despierta a los generadores que esperan frame para que terminen
+        with self.frame_cond:
+            self.frame_cond.notify_all()
         # Libera la conexión con la cámara si está abierta
         if self.cap:
             self.cap.release()
@@ -166,13 +297,14 @@ class VideoCamera:
     # ------------------------------------------------------------
     def ensure_alive(self):
         """Verifica que el RTSP siga activo; si no, reabre conexión."""
-        # Intenta abrir una conexión temporal para comprobar estado
-        test_cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG)
-         # Si no logra abrir, significa que el RTSP cayó → reconecta
-        if not test_cap.isOpened():
+        # Usa la propia captura como señal de vida: si llegaron frames recientes, el RTSP
+        # está activo. No se abre un segundo VideoCapture de prueba (eso fuerza un
+        # handshake RTSP completo y puede agotar el límite de sesiones de la Amcrest).
+        if time.time() - self.last_frame_time > ALIVE_TIMEOUT:
             print(f" RTSP inactivo en {self.rtsp_url}, reconectando...")
             self.reconnect()
-        test_cap.release()
+            return False
+        return True
 
 
 # ============================================================
@@ -186,27 +318,25 @@ def mjpeg_generator(camera: VideoCamera):
     
     """
     print(f"Iniciando generador MJPEG para {camera.rtsp_url}")
-    time.sleep(0.5)
+    seq = 0  # Último frame enviado a este cliente
 
     # Bucle que continúa mientras la cámara siga activa
     while camera.running:
+        # Espera (sin sondeo) a que el hilo de captura publique un frame nuevo
+        new_seq = camera.wait_frame(seq)
+        if new_seq == seq:
+            continue  # Timeout sin frame nuevo → vuelve a esperar
+        seq = new_seq
+
         # Obtiene el frame actual codificado en JPEG
         frame = camera.get_jpeg_frame()
-
-        # Si aún no hay frame disponible, espera y repite
         if frame is None:
-            time.sleep(0.05)
             continue
 
-        # Construye el bloque de bytes multipart/x-mixed-replace con el frame JPEG
-        yield (
-            b"--frame\r\n"
-            b"Content-Type: image/jpeg\r\n\r\n" +
-            frame + b"\r\n"
-        )
-
-        # Control de tasa de actualización 
-        time.sleep(0.05)
+        # Envía el bloque multipart/x-mixed-replace con el frame JPEG (sin concatenar)
+        yield MJPEG_PART_HEADER % len(frame)
+        yield frame
+        yield MJPEG_PART_END
 
     print(f" Finalizando MJPEG para {camera.rtsp_url}")
 
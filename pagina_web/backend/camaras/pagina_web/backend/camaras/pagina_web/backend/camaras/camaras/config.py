@@ -19,3 +19,10 @@ CAMERAS = {
     # Si luego se agregan más, copiar y pegar con IDs "3"..."6"
 }
 
+# URLs de los CGI de cada cámara, armadas una sola vez al importar
+# (la IP es fija por cámara; las vistas no formatean la URL en cada petición).
+for _cam in CAMERAS.values():
+    _cam["status_url"] = f"http://{_cam['ip']}/cgi-bin/magicBox.cgi"  # Información del sistema (estado)
+    _cam["ptz_url"] = f"http://{_cam['ip']}/cgi-bin/ptz.cgi"           # Control PTZ
+del _cam
+
@@ -53,6 +53,19 @@ urlpatterns = [
     # --------------------------------------------------------
     path("api/cameras/<cam_id>/status/", views.status_view, name="camera_status"),   # Estado online/offline
 
+    # --------------------------------------------------------
+    # Ruta: /api/cameras/status_all/
+    # --------------------------------------------------------
+    # Método HTTP permitido: GET
+    # Función asociada: views.status_all_view
+    # Descripción:
+    #   Devuelve el estado de todas las cámaras en una sola respuesta
+    #   (consultadas en paralelo):
+    #       {"cameras": [{"id": "1", "online": true}, ...]}
+    # --------------------------------------------------------
+    path("api/cameras/status_all/", views.status_all_view, name="camera_status_all"),  # Estado de todas
+    path("api/cameras/status/stream/", views.status_stream_view, name="camera_status_stream"),  # Estado en vivo (SSE)
+
     # --------------------------------------------------------
     # Ruta: /api/cameras/<id>/ptz/
     # --------------------------------------------------------
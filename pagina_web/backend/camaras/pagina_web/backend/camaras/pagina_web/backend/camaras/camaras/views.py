@@ -13,6 +13,8 @@
 #
 # Las vistas están protegidas mediante decoradores que restringen los métodos HTTP
 # permitidos (GET o POST) y manejan el acceso CSRF cuando es necesario.
+# Son vistas asíncronas (async def): el proyecto corre sobre ASGI (Channels), así que
+# mientras se espera a la cámara el servidor puede atender otras peticiones.
 # También se utilizan solicitudes HTTP Digest Authentication para comunicarse 
 # de forma segura con las cámaras Amcrest.
 # ============================================================
@@ -23,17 +25,23 @@
 # ------------------------------------------------------------
 # Importación de librerías estándar
 # ------------------------------------------------------------
-import time  # Para pausas breves entre comandos PTZ
-import json  # Para decodificar el cuerpo de las solicitudes POST (JSON)
+import asyncio  # Vistas asíncronas: esperas sin bloquear hilos del servidor
+import threading  # Lock por cámara para no intercalar comandos PTZ
+import time  # Pausa entre "start" y "stop" en el hilo de fondo
+from concurrent.futures import ThreadPoolExecutor  # Hilos para E/S de cámaras y "stop" diferidos
+from functools import partial  # Fija argumentos con nombre para run_in_executor
+import orjson  # Decodificación JSON rápida del cuerpo de las solicitudes POST (acepta bytes)
 import requests  # Librería para realizar peticiones HTTP a las cámaras
+from requests.exceptions import RequestException  # Base de los errores de red/HTTP de requests
 from requests.auth import HTTPDigestAuth  # Mecanismo de autenticación segura (Digest)
+from requests.adapters import HTTPAdapter  # Pool de conexiones reutilizables (keep-alive)
 
 # ------------------------------------------------------------
 # Importación de herramientas propias de Django
 # ------------------------------------------------------------
 from django.http import (
-    StreamingHttpResponse, # Permitiría transmisión MJPEG (no usada actualmente)
-    JsonResponse,  # Devuelve respuestas JSON (formato clave-valor)
+    HttpResponse,  # Respuestas con cuerpo ya serializado
+    StreamingHttpResponse, # Respuesta en flujo (estado en vivo por Server-Sent Events)
     HttpResponseBadRequest  #Devuelve código 400 si la solicitud es inválida
 )
 from django.views.decorators.http import require_http_methods # Restringe los métodos HTTP permitidos (GET, POST)
@@ -47,27 +55,256 @@ from django.views.decorators.gzip import gzip_page # (No usada, útil si se quis
 # ------------------------------------------------------------
 
 from .config import CAMERAS
+from django.conf import settings  # Tiempos de espera configurables (settings.py)
+
+# Timeout (conexión, lectura) para las peticiones a las cámaras.
+# La conexión en la LAN tarda milisegundos: un connect corto detecta rápido una cámara
+# apagada, mientras que la lectura deja margen a la respuesta del CGI.
+CAM_TIMEOUT = (
+    getattr(settings, "CAM_CONNECT_TIMEOUT", 0.3),
+    getattr(settings, "CAM_READ_TIMEOUT", 1.0),
+)
+
+
+# ------------------------------------------------------------
+# Sesiones HTTP por cámara
+# ------------------------------------------------------------
+# Cada cámara tiene su propia Session con su HTTPDigestAuth fijo (session.auth).
+# Reutilizar la misma instancia de HTTPDigestAuth conserva el nonce de la cámara,
+# así que después de la primera petición ya no se repite el reto 401 en cada llamada;
+# la Session además reutiliza la conexión TCP (keep-alive).
+_SESSIONS = {}  # cam_id -> requests.Session (se crean bajo demanda)
+
+
+def _session_for(cam_id, cam):
+    """Devuelve (creándola si no existe) la Session autenticada de la cámara indicada."""
+    sess = _SESSIONS.get(cam_id)
+    if sess is None:
+        sess = requests.Session()
+        sess.auth = HTTPDigestAuth(cam["user"], cam["password"])  # Digest cacheado por cámara
+        # Pool dimensionado para un solo host: 1 pool, hasta 4 sockets keep-alive
+        # (estado + start/stop PTZ concurrentes). Sin reintentos: es mejor reportar
+        # "offline" rápido que repetir una petición a una cámara que no responde.
+        sess.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+        _SESSIONS[cam_id] = sess
+    return sess
+
+
+# ------------------------------------------------------------
+# Pool de hilos para la E/S con las cámaras
+# ------------------------------------------------------------
+# requests es bloqueante, así que cada llamada a una cámara ocupa un hilo.
+# En lugar del executor por defecto de asyncio (compartido con todo el proceso
+# ASGI, min(32, CPUs + 4) hilos) se usa un pool propio: el número de llamadas
+# simultáneas a cámaras no depende de los workers del servidor ni compite con
+# otras tareas que usen asyncio.to_thread.
+_CAM_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="cam-io")
+
+
+def _cam_io(fn, *args, **kwargs):
+    """Ejecuta fn(*args, **kwargs) en _CAM_POOL y devuelve un awaitable con el resultado."""
+    return asyncio.get_running_loop().run_in_executor(_CAM_POOL, partial(fn, *args, **kwargs))
+
+
+# ------------------------------------------------------------
+# Constantes PTZ (se construyen una sola vez al importar el módulo)
+# ------------------------------------------------------------
+# Mapeo de comandos lógicos → comandos reales Amcrest
+PTZ_MAPPING = {
+    "up": "Up",
+    "down": "Down",
+    "left": "Left",
+    "right": "Right",
+    "home": "Home",
+    "center": "Home",
+    "reset": "Home",
+}
+
+
+def _ptz_params(action, code, speed):
+    """
+    Parámetros de ptz.cgi como tupla de pares (requests los acepta así y
+    mantiene el orden): acción, canal, dirección y velocidad (arg2).
+    """
+    return (
+        ("action", action),
+        ("channel", 0),
+        ("code", code),
+        ("arg1", 0),
+        ("arg2", speed),
+        ("arg3", 0),
+    )
+
+
+# ------------------------------------------------------------
+# Envío de comandos PTZ en segundo plano
+# ------------------------------------------------------------
+PTZ_PULSE = 0.25  # Segundos que dura un movimiento antes del "stop"
+PTZ_HOLD = 0.4    # Extensión del movimiento cuando llega el mismo comando (botón mantenido)
+
+# El "stop" se envía desde un hilo de fondo, así la respuesta HTTP sale justo
+# después del "start" en lugar de esperar los 0.25 s del pulso.
+_PTZ_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ptz-stop")
+_PTZ_LOCKS = {}  # cam_id -> threading.Lock (un pulso start/stop a la vez por cámara)
+
+# Movimiento en curso por cámara: {"code": "Up", "expires": t_monotonic}.
+# Si el frontend repite el mismo comando (botón mantenido) mientras la cámara ya se
+# mueve en esa dirección, solo se extiende "expires" y no se envía nada a la cámara.
+_PTZ_STATE = {}
+_PTZ_COND = threading.Condition()  # Protege _PTZ_STATE y despierta al hilo del "stop"
+
+
+def _ptz_lock(cam_id):
+    """Devuelve el lock PTZ de la cámara (setdefault es atómico en CPython)."""
+    return _PTZ_LOCKS.setdefault(cam_id, threading.Lock())
+
+
+def _ptz_command(session, cam_id, url, code, speed):
+    """
+    Ejecuta un comando PTZ con coalescencia de repeticiones.
+
+    - Mismo comando que el movimiento en curso → solo extiende el movimiento.
+    - Comando distinto → adelanta el "stop" del movimiento anterior, envía el
+      nuevo "start" y programa su "stop" en segundo plano.
+
+    El lock de la cámara se toma aquí y lo libera el hilo del "stop" (un
+    threading.Lock puede liberarse desde otro hilo). Así un segundo comando
+    para la misma cámara espera a que termine el movimiento anterior y nunca
+    queda un "stop" viejo intercalado después de un "start" nuevo.
+    """
+    with _PTZ_COND:
+        state = _PTZ_STATE.get(cam_id)
+        if state is not None:
+            if state["code"] == code and state["expires"] > time.monotonic():
+                state["expires"] = time.monotonic() + PTZ_HOLD
+                return                                   # Ya se mueve en esa dirección
+            state["expires"] = 0                         # Otra dirección: detener ya
+            _PTZ_COND.notify_all()
+
+    lock = _ptz_lock(cam_id)
+    lock.acquire()                                       # Espera el "stop" anterior, si lo hay
+    try:
+        session.get(url, params=_ptz_params("start", code, speed), timeout=CAM_TIMEOUT)
+    except Exception:
+        lock.release()
+        raise
+    if code == "Home":                                   # "Home" no necesita "stop"
+        lock.release()
+        return
+
+    state = {"code": code, "expires": time.monotonic() + PTZ_PULSE}
+    with _PTZ_COND:
+        _PTZ_STATE[cam_id] = state
+    _PTZ_EXECUTOR.submit(_ptz_delayed_stop, session, lock, cam_id, url, state, speed)
+
+
+def _ptz_delayed_stop(session, lock, cam_id, url, state, speed):
+    """Espera a que venza el movimiento, envía el "stop" y libera el lock de la cámara."""
+    try:
+        with _PTZ_COND:
+            while True:
+                remaining = state["expires"] - time.monotonic()
+                if remaining <= 0:
+                    break
+                _PTZ_COND.wait(remaining)                # Se despierta antes si cambia la dirección
+            if _PTZ_STATE.get(cam_id) is state:
+                del _PTZ_STATE[cam_id]
+        session.get(url, params=_ptz_params("stop", state["code"], speed), timeout=CAM_TIMEOUT)
+    except Exception as e:
+        print(f"[PTZ] Error enviando stop a {url}: {e}")
+    finally:
+        lock.release()
+
+
+# Cuerpos de respuesta constantes (se construyen una vez, no se serializan en cada petición)
+_OK_BODY = b'{"ok": true}'            # PTZ exitoso
+_ONLINE_TRUE = b'{"online": true}'    # status_view: cámara responde
+_ONLINE_FALSE = b'{"online": false}'  # status_view: cámara sin respuesta
+
+
+def _json(data, status=200):
+    """
+    Respuesta JSON serializada con orjson. Sustituye a JsonResponse, que pasa por
+    DjangoJSONEncoder (Decimal, UUID, fechas...) innecesario para estos payloads.
+    """
+    return HttpResponse(orjson.dumps(data), content_type="application/json", status=status)
 
 
 # ===========================================================
 # Funciones auxiliares
 # ===========================================================
-def _get_cam(cam_id):
-    """
-    Busca y devuelve el diccionario de configuración correspondiente
-    a una cámara específica, según su ID lógico.
-    Ejemplo:
-        _get_cam("1") -> devuelve CAMERAS["1"]
+# Busca el diccionario de configuración de una cámara según su ID lógico.
+# Ejemplo: _get_cam("1") -> CAMERAS["1"]  (None si no existe)
+# CAMERAS ya es un dict indexado por ID, así que se enlaza directamente su método
+# .get: búsqueda O(1) sin el marco de llamada extra de una función envoltorio.
+# El convertidor por defecto de <cam_id> en urls.py ya entrega un str.
+_get_cam = CAMERAS.get
+
 
+async def _ping(cam_id, cam):
     """
-    return CAMERAS.get(str(cam_id))  # Convierte el ID a string para evitar errores de tipo
+    Consulta el CGI de información del sistema de una cámara Amcrest.
+    Devuelve True si la cámara responde con HTTP 200, False en cualquier otro caso.
+    """
+    session = _session_for(cam_id, cam)  # Session con Digest Auth ya configurado
+
+    # Endpoint interno de las cámaras Amcrest que devuelve información del sistema
+    # (URL precalculada en config.py)
+    url = cam["status_url"]
+    # Parámetro que solicita información básica del dispositivo
+    params = {"action": "getSystemInfo"}
+
+    try:
+         # Envía solicitud GET autenticada por Digest Auth.
+         # requests es bloqueante: se ejecuta en _CAM_POOL para no detener el event loop.
+        r = await _cam_io(
+            session.get, url, params=params, timeout=CAM_TIMEOUT
+        )
+        # Si la cámara responde con código 200, se considera "online"
+        return r.status_code == 200
+    except RequestException:
+        # Sin conexión o timeout → "offline" (otros errores son bugs y llegan al log como 500)
+        return False
+
+
+# ------------------------------------------------------------
+# Caché corta del estado online/offline
+# ------------------------------------------------------------
+# Varias pestañas o dashboards consultando la misma cámara en la misma ventana
+# de CAM_STATUS_TTL segundos reciben el resultado guardado, y si ya hay una
+# consulta en curso para esa cámara se espera esa misma en lugar de abrir otra.
+# Todo ocurre en el event loop (un solo hilo), por eso no hace falta un lock.
+CAM_STATUS_TTL = getattr(settings, "CAM_STATUS_TTL", 2.0)
+_STATUS_CACHE = {}     # cam_id -> (expira_monotonic, online)
+_STATUS_INFLIGHT = {}  # cam_id -> asyncio.Task de la consulta en curso
+
+
+def _store_status(cam_id, task):
+    """Callback al terminar una consulta: guarda el resultado y libera el slot en curso."""
+    _STATUS_INFLIGHT.pop(cam_id, None)
+    if not task.cancelled() and task.exception() is None:
+        _STATUS_CACHE[cam_id] = (time.monotonic() + CAM_STATUS_TTL, task.result())
+
+
+async def _ping_cached(cam_id, cam):
+    """Igual que _ping, pero reutiliza resultados recientes y consultas en curso."""
+    hit = _STATUS_CACHE.get(cam_id)
+    if hit is not None and hit[0] > time.monotonic():
+        return hit[1]
+    task = _STATUS_INFLIGHT.get(cam_id)
+    if task is None:
+        task = asyncio.ensure_future(_ping(cam_id, cam))
+        task.add_done_callback(partial(_store_status, cam_id))
+        _STATUS_INFLIGHT[cam_id] = task
+    # shield: si un navegador se desconecta no se cancela la consulta que comparten otros
+    return await asyncio.shield(task)
 
 # ============================================================
 # VISTA 1: ESTADO ONLINE/OFFLINE
 # ============================================================
 
 @require_http_methods(["GET"]) # Solo permite solicitudes HTTP GET
-def status_view(request, cam_id):
+async def status_view(request, cam_id):
     """
      Endpoint: GET /api/cameras/<id>/status/
     ------------------------------------------------------------
@@ -83,26 +320,105 @@ def status_view(request, cam_id):
         # Si el ID no existe en config.py, devuelve error HTTP 400
         return HttpResponseBadRequest("Cámara no encontrada")
 
-     # Extrae datos de conexión desde el diccionario de configuración
-    ip = cam["ip"]
-    user = cam["user"]
-    pwd = cam["password"]
+    online = await _ping_cached(cam_id, cam)
+    return HttpResponse(_ONLINE_TRUE if online else _ONLINE_FALSE, content_type="application/json")
 
-    # Endpoint interno de las cámaras Amcrest que devuelve información del sistema
-    url = f"http://{ip}/cgi-bin/magicBox.cgi"
-    # Parámetro que solicita información básica del dispositivo
-    params = {"action": "getSystemInfo"}
 
+# ============================================================
+# VISTA 1b: ESTADO DE TODAS LAS CÁMARAS (una sola petición)
+# ============================================================
+
+@require_http_methods(["GET"]) # Solo permite solicitudes HTTP GET
+async def status_all_view(request):
+    """
+     Endpoint: GET /api/cameras/status_all/
+    ------------------------------------------------------------
+    Función:
+        Consulta todas las cámaras de config.py en paralelo (asyncio.gather),
+        de modo que el tiempo total es el de la cámara más lenta y no la suma.
+    Retorna:
+        {"cameras": [{"id": "1", "online": true}, {"id": "2", "online": false}, ...]}
+    """
+    ids = list(CAMERAS)
+    results = await asyncio.gather(*(_ping_cached(cid, CAMERAS[cid]) for cid in ids))
+    return _json({
+        "cameras": [{"id": cid, "online": online} for cid, online in zip(ids, results)]
+    })
+
+
+# ============================================================
+# VISTA 1c: ESTADO EN VIVO (Server-Sent Events)
+# ============================================================
+# Un único bucle por proceso consulta todas las cámaras cada CAM_STATUS_INTERVAL
+# segundos y solo envía a los navegadores los cambios de estado. Así las consultas
+# a las cámaras no se multiplican por el número de navegadores abiertos y el
+# frontend deja de hacer polling. El bucle se detiene solo cuando no queda
+# ningún navegador conectado.
+CAM_STATUS_INTERVAL = getattr(settings, "CAM_STATUS_INTERVAL", 2.0)
+SSE_KEEPALIVE = 15.0  # Comentario SSE periódico para que proxies no cierren la conexión
+
+_STATUS_LAST = {}            # cam_id -> último estado conocido (True/False)
+_STATUS_SUBSCRIBERS = set()  # Una asyncio.Queue por navegador conectado
+_STATUS_TASK = None          # Tarea del bucle de consulta (None si no hay suscriptores)
+
+
+def _status_event(cam_id, online):
+    """Evento SSE con el estado de una cámara: data: {"id": "1", "online": true}"""
+    return b"data: " + orjson.dumps({"id": cam_id, "online": online}) + b"\n\n"
+
+
+async def _status_loop():
+    """Consulta todas las cámaras en paralelo y publica solo los cambios de estado."""
+    global _STATUS_TASK
+    ids = list(CAMERAS)
     try:
-         # Envía solicitud GET autenticada por Digest Auth
-        r = requests.get(url, params=params, auth=HTTPDigestAuth(user, pwd), timeout=1.5)
-        # Si la cámara responde con código 200, se considera "online"
-        online = (r.status_code == 200)
-    except Exception:
-        # Si la cámara responde con código 200, se considera "online"
-        online = False
+        while _STATUS_SUBSCRIBERS:
+            results = await asyncio.gather(*(_ping_cached(cid, CAMERAS[cid]) for cid in ids))
+            for cid, online in zip(ids, results):
+                if _STATUS_LAST.get(cid) is not online:       # Primera consulta o cambio de estado
+                    _STATUS_LAST[cid] = online
+                    event = _status_event(cid, online)
+                    for queue in _STATUS_SUBSCRIBERS:
+                        queue.put_nowait(event)
+            await asyncio.sleep(CAM_STATUS_INTERVAL)
+    finally:
+        _STATUS_TASK = None
+        _STATUS_LAST.clear()  # Al reiniciar, el primer ciclo vuelve a publicar todo
+
+
+@require_http_methods(["GET"]) # Solo permite solicitudes HTTP GET
+async def status_stream_view(request):
+    """
+     Endpoint: GET /api/cameras/status/stream/
+    ------------------------------------------------------------
+    Función:
+        Flujo text/event-stream con el estado de las cámaras. Al conectarse se
+        envía el último estado conocido de cada cámara y después solo los cambios.
+    Eventos:
+        data: {"id": "1", "online": true}
+    """
+    async def events():
+        global _STATUS_TASK
+        queue = asyncio.Queue()
+        _STATUS_SUBSCRIBERS.add(queue)
+        for cid, online in _STATUS_LAST.items():            # Estado inicial para este navegador
+            queue.put_nowait(_status_event(cid, online))
+        if _STATUS_TASK is None:
+            _STATUS_TASK = asyncio.create_task(_status_loop())
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+        finally:
+            # El navegador se desconectó (Django cancela el generador)
+            _STATUS_SUBSCRIBERS.discard(queue)
 
-    return JsonResponse({"online": online})
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"   # Los eventos no se deben cachear
+    response["X-Accel-Buffering"] = "no"     # Evita que un proxy nginx acumule los eventos
+    return response
 
 
 # ============================================================
@@ -111,7 +427,7 @@ def status_view(request, cam_id):
 @csrf_exempt  # Desactiva CSRF porque este endpoint recibe comandos externos
 @require_http_methods(["POST"])  # Solo permite solicitudes HTTP POST
 
-def ptz_view(request, cam_id):
+async def ptz_view(request, cam_id):
     """
     Endpoint: POST /api/cameras/<id>/ptz/
     ------------------------------------------------------------
@@ -133,7 +449,7 @@ def ptz_view(request, cam_id):
     # -----------------------------------------------------------
 
     try:
-        data = json.loads(request.body or "{}") # Convierte JSON en diccionario Python
+        data = orjson.loads(request.body or b"{}") # Convierte JSON (bytes) en diccionario Python
         cmd = str(data.get("cmd", "")).lower()  # Convierte el comando a minúsculas
         speed = int(data.get("speed", 4))       #Velocidad por defecto 4
     except Exception:
@@ -141,20 +457,9 @@ def ptz_view(request, cam_id):
         return HttpResponseBadRequest("JSON inválido")
     
     # ------------------------------------------------------------
-    # Mapeo de comandos lógicos → comandos reales Amcrest
+    # Busca el comando real Amcrest (ver PTZ_MAPPING)
     # ------------------------------------------------------------
-    mapping = {
-        "up": "Up",
-        "down": "Down",
-        "left": "Left",
-        "right": "Right",
-        "home": "Home",
-        "center": "Home",
-        "reset": "Home",
-    }
-
-    # Busca el comando real
-    code = mapping.get(cmd)
+    code = PTZ_MAPPING.get(cmd)
     if not code:
         # Si el comando no está en el mapeo, devuelve error
         return HttpResponseBadRequest("Comando PTZ no soportado")
@@ -162,34 +467,23 @@ def ptz_view(request, cam_id):
     # ------------------------------------------------------------
     # Construcción de la solicitud HTTP hacia la cámara Amcrest
     # ------------------------------------------------------------
-    ip = cam["ip"]
-    user = cam["user"]
-    pwd = cam["password"]
-    # URL del endpoint PTZ propio de las cámaras Amcrest
-    url = f"http://{ip}/cgi-bin/ptz.cgi"
-
-    # Comando de inicio ("start"): indica dirección, canal y velocidad
-    start = {"action": "start", "channel": 0, "code": code, "arg1": 0, "arg2": speed, "arg3": 0}
-
-    # Comando de parada ("stop"): detiene el movimiento
-    stop  = {"action": "stop",  "channel": 0, "code": code, "arg1": 0, "arg2": speed, "arg3": 0} 
+    session = _session_for(cam_id, cam)  # Session con Digest Auth ya configurado
+    # URL del endpoint PTZ propio de las cámaras Amcrest (precalculada en config.py)
+    url = cam["ptz_url"]
 
     # ------------------------------------------------------------
     # Ejecución de los comandos en la cámara
     # ------------------------------------------------------------
     try:
-        # Envía el comando "start" para comenzar el movimiento PTZ 
-        requests.get(url, params=start, auth=HTTPDigestAuth(user, pwd), timeout=1.5)
-
-         # Si el comando no es "Home", espera 0.25s y 
-         # luego detiene el movimiento (no aplica para estas cámaras
-         #ya que no tienen zoom ni home, pero está esta funcionalidad
+         # Envía el comando "start" ("action=start": dirección, canal y velocidad)
+         # para comenzar el movimiento PTZ. Si el comando no es "Home", el "stop"
+         # se envía desde un hilo de fondo al vencer el movimiento (no aplica para
+         # estas cámaras ya que no tienen zoom ni home, pero está esta funcionalidad
          # por si se cambia de cámaras en el futuro y se desea agregar)
-        if code != "Home":
-            time.sleep(0.25)
-            requests.get(url, params=stop, auth=HTTPDigestAuth(user, pwd), timeout=1.5)
-        return JsonResponse({"ok": True})
-    # Envía comando "stop" para detener el movimiento
-    except Exception as e:
-        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+        await _cam_io(_ptz_command, session, cam_id, url, code, speed)
+        return HttpResponse(_OK_BODY, content_type="application/json")
+    # Solo errores de red/HTTP con la cámara se reportan como {"ok": false};
+    # cualquier otra excepción es un bug y se propaga al manejador 500 de Django.
+    except RequestException as e:
+        return _json({"ok": False, "error": str(e)}, status=500)
 
@@ -46,3 +46,17 @@ class InterfazConfig(AppConfig):
     # dentro del archivo settings.py del proyecto.
     # --------------------------------------------------------------------------
     name = 'interfaz'
+
+    # --------------------------------------------------------------------------
+    # Se ejecuta una vez cuando Django termina de cargar las aplicaciones.
+    # - Instancia los validadores de AUTH_PASSWORD_VALIDATORS (la lista de Django
+    #   queda cacheada): CommonPasswordValidator descomprime y carga su archivo de
+    #   contraseñas comunes en __init__, así ese costo ocurre al arrancar y no en
+    #   el primer cambio de contraseña.
+    # - Importa authentication.py para conectar las señales que invalidan la
+    #   caché de usuarios autenticados por JWT.
+    # --------------------------------------------------------------------------
+    def ready(self):
+        from django.contrib.auth.password_validation import get_default_password_validators
+        get_default_password_validators()
+        from . import authentication  # noqa: F401  (registra las señales)
@@ -0,0 +1,74 @@
+# ======================================================================================
+# Archivo: authentication.py
+# Ubicación: backend/interfaz/
+#
+# Descripción general:
+# --------------------------------------------------------------------------------------
+# Autenticación JWT con caché del usuario.
+#
+# JWTAuthentication de SimpleJWT busca el usuario en la base de datos (por el claim
+# user_id) en cada petición autenticada. CachedJWTAuthentication guarda ese usuario
+# en la caché de Django durante unos segundos, de modo que las peticiones seguidas
+# del mismo usuario no repiten la consulta.
+#
+# La entrada se invalida al guardar o eliminar el usuario (señales post_save /
+# post_delete, conectadas al importar este módulo desde InterfazConfig.ready()),
+# así un cambio de contraseña, rol o estado activo se refleja de inmediato.
+#
+# La caché usada es la "default" de settings.CACHES (LocMemCache por proceso si no
+# se configura otra; con Redis/Memcached queda compartida entre procesos).
+#
+# Autora: Sara Hernández
+# ======================================================================================
+
+
+# --------------------------------------------------------------------------------------
+# Importaciones necesarias
+# --------------------------------------------------------------------------------------
+import time                                                             # Segundos restantes del token
+from django.core.cache import cache                                     # Caché configurada en settings.CACHES
+from django.db.models.signals import post_delete, post_save             # Invalidación al modificar usuarios
+from django.dispatch import receiver                                    # Decorador para conectar señales
+from rest_framework_simplejwt.authentication import JWTAuthentication   # Autenticación JWT base
+from rest_framework_simplejwt.settings import api_settings              # Nombre del claim con el ID de usuario
+from .models import UsuarioPersonalizado                                # Modelo de usuario
+
+
+USER_CACHE_TTL = 30   # Segundos máximos que se reutiliza un usuario en caché
+
+
+def _cache_key(user_id):
+    """Clave de caché del usuario autenticado."""
+    return f"jwt_user:{user_id}"
+
+
+# ======================================================================================
+# CLASE: CachedJWTAuthentication
+# --------------------------------------------------------------------------------------
+# Igual que JWTAuthentication, pero consulta primero la caché. En caso de fallo se
+# usa la búsqueda normal (que valida usuario activo, etc.) y se guarda el resultado
+# por min(USER_CACHE_TTL, vida restante del token) segundos.
+# ======================================================================================
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)                    # Lanza el error estándar de SimpleJWT
+
+        key = _cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)                    # Consulta a la base de datos
+            ttl = min(USER_CACHE_TTL, int(validated_token.get('exp', 0) - time.time()))
+            if ttl > 0:
+                cache.set(key, user, ttl)
+        return user
+
+
+# --------------------------------------------------------------------------------------
+# Invalidación de la caché al modificar o eliminar un usuario
+# --------------------------------------------------------------------------------------
+@receiver(post_save, sender=UsuarioPersonalizado)
+@receiver(post_delete, sender=UsuarioPersonalizado)
+def _invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(_cache_key(instance.pk))
@@ -0,0 +1,34 @@
+# ======================================================================================
+# Archivo: hashers.py
+# Ubicación: backend/interfaz/
+#
+# Descripción general:
+# --------------------------------------------------------------------------------------
+# Hasher de contraseñas Argon2id con parámetros ajustados para este servidor.
+#
+# El Argon2PasswordHasher de Django usa memory_cost=100 MiB y parallelism=8. Con
+# time_cost=2, memory_cost=64 MiB y parallelism=2 cada verificación (login, cambio de
+# contraseña) toma unas decenas de milisegundos y sigue siendo "memory-hard", es
+# decir, costosa de atacar con GPU.
+#
+# El algoritmo sigue siendo "argon2": los hashes creados con los parámetros por
+# defecto de Django validan igual y se re-hashean con estos parámetros en el
+# siguiente login exitoso (must_update).
+#
+# Autora: Sara Hernández
+# ======================================================================================
+
+
+# --------------------------------------------------------------------------------------
+# Importaciones necesarias
+# --------------------------------------------------------------------------------------
+from django.contrib.auth.hashers import Argon2PasswordHasher    # Hasher Argon2id base (requiere argon2-cffi)
+
+
+# ======================================================================================
+# CLASE: TunedArgon2PasswordHasher
+# ======================================================================================
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    time_cost = 2               # Pasadas sobre la memoria
+    memory_cost = 64 * 1024     # KiB de memoria por hash (64 MiB)
+    parallelism = 2             # Hilos usados por cada hash
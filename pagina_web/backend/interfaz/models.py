@@ -26,8 +26,11 @@
 # Importaciones necesarias
 # --------------------------------------------------------------------------------------
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin  # Clases base para personalizar usuarios
-from django.db import models                                                                 # Para definir los campos de los modelos
+from django.db import models, transaction                                                    # Campos de los modelos y transacciones
+from django.db.models import F, Q                                                            # Expresiones y condiciones evaluadas en la base de datos
+from django.db.models.functions import Lower                                                 # LOWER(...) para búsquedas sin mayúsculas
 from django.utils import timezone                                                            # Para obtener fechas y horas 
+from django.utils.functional import cached_property                                          # Atributos calculados una vez por instancia
 
 
 # ======================================================================================
@@ -132,6 +135,13 @@ class UsuarioPersonalizado(AbstractBaseUser, PermissionsMixin):
     # ------------------------------
     objects = UsuarioManager()                                                              # Asocia el manager definido arriba
 
+    # Índice funcional sobre LOWER(email) y no columna CITEXT: CIEmailField se eliminó
+    # en Django 5.1 y el proyecto usa SQLite, que no tiene el tipo citext.
+    class Meta:
+        indexes = [
+            models.Index(Lower('email'), name='usr_email_lower_idx'),                       # Búsqueda por email sin distinguir mayúsculas
+        ]
+
     # ------------------------------
     # Métodos útiles
     # ------------------------------
@@ -139,9 +149,34 @@ class UsuarioPersonalizado(AbstractBaseUser, PermissionsMixin):
         """Devuelve una representación legible del usuario."""
         return f"{self.nombre} ({self.email})"                                              # Ejemplo: "Sara (her21743@uvg.edu.gt)"
 
-    def mark_password_changed(self):
-        """Marca el timestamp actual como fecha de cambio de contraseña."""
+    @cached_property
+    def rol_normalized(self):
+        """Rol sin espacios y en minúsculas (se calcula una vez por instancia cargada)."""
+        return str(self.rol or '').strip().lower()
+
+    def mark_password_changed(self, commit=False):
+        """
+        Marca el timestamp actual como fecha de cambio de contraseña.
+        Con commit=True guarda solo esa columna (UPDATE de un campo, no de toda la fila).
+        """
         self.password_changed_at = timezone.now()                                           # Registra el cambio de contraseña
+        if commit:
+            self.save(update_fields=['password_changed_at'])                                # Escribe únicamente el timestamp
+
+    # Columnas que cambian al actualizar la contraseña
+    PASSWORD_FIELDS = ('password', 'must_change_password', 'password_changed_at')
+
+    def apply_new_password(self, raw_password):
+        """
+        Aplica una nueva contraseña: hash, desactiva el cambio obligatorio y registra
+        el timestamp, guardando solo esas tres columnas en un único UPDATE.
+        El hash se calcula antes de abrir la transacción para que sea lo más corta posible.
+        """
+        self.set_password(raw_password)                                                     # Hash (costoso, fuera de la transacción)
+        self.must_change_password = False                                                   # Ya no se exige cambio
+        self.mark_password_changed()                                                        # Timestamp (sin guardar aún)
+        with transaction.atomic():                                                          # Un solo COMMIT
+            self.save(update_fields=self.PASSWORD_FIELDS)
 
 
 # ======================================================================================
@@ -152,7 +187,12 @@ class UsuarioPersonalizado(AbstractBaseUser, PermissionsMixin):
 # ======================================================================================
 class LoginRecord(models.Model):
     usuario = models.ForeignKey(UsuarioPersonalizado, on_delete=models.CASCADE)              # Relación 1:N (usuario → logins)
-    timestamp = models.DateTimeField(auto_now_add=True)                                     # Fecha/hora automática de login
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)                      # Fecha/hora automática de login (indexada)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', '-timestamp'], name='loginrec_user_ts_idx'),    # Historial de logins por usuario
+        ]
 
     def __str__(self):
         """Muestra email y hora del login."""
@@ -174,6 +214,25 @@ class UserStatistic(models.Model):
         unique_together = ('usuario', 'date')                                               # Evita duplicados por usuario y día
         ordering = ['-date']                                                                # Ordena de la más reciente a la más antigua
 
+    @classmethod
+    def add_time(cls, user, minutes, date=None):
+        """
+        Suma 'minutes' al tiempo del día sin leer la fila (sin read-modify-write).
+
+        Primero intenta UPDATE ... SET total_time = total_time + %s, que es atómico en la
+        base de datos. Solo si no existe la fila del día se crea con get_or_create; si otra
+        petición la creó en paralelo se repite el UPDATE con F(). No se usa
+        bulk_create(update_conflicts=True) porque Django genera SET total_time =
+        EXCLUDED.total_time (sobrescribe, no acumula).
+        """
+        date = date or timezone.localdate()                                                 # Día actual por defecto
+        qs = cls.objects.filter(usuario=user, date=date)
+        if qs.update(total_time=F('total_time') + minutes):                                 # Caso común: la fila ya existe
+            return
+        _, created = cls.objects.get_or_create(usuario=user, date=date, defaults={'total_time': minutes})
+        if not created:                                                                     # Carrera: otra petición creó la fila
+            qs.update(total_time=F('total_time') + minutes)
+
     def __str__(self):
         """Devuelve una representación legible de la estadística."""
         return f"{self.usuario.email} - {self.date}: {self.total_time:.1f} min"
@@ -187,22 +246,48 @@ class UserStatistic(models.Model):
 # ======================================================================================
 class UserSession(models.Model):
     usuario = models.ForeignKey(UsuarioPersonalizado, on_delete=models.CASCADE)              # Relación con el usuario
-    start_time = models.DateTimeField(auto_now_add=True)                                    # Momento de inicio
+    start_time = models.DateTimeField(auto_now_add=True, db_index=True)                     # Momento de inicio (indexado)
     end_time = models.DateTimeField(null=True, blank=True)                                  # Momento de fin (puede no existir aún)
     duration = models.FloatField(default=0.0)                                               # Duración total en minutos
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', '-start_time'], name='usession_user_start_idx'), # Sesiones por usuario (recientes primero)
+            # Índice parcial: solo las sesiones abiertas (end_time IS NULL), que son las que
+            # buscan LogoutView y el listado de estadísticas. Se mantiene pequeño aunque el
+            # historial crezca (PostgreSQL y SQLite soportan índices parciales).
+            models.Index(
+                fields=['usuario', '-start_time'],
+                condition=Q(end_time__isnull=True),
+                name='usession_open_by_user',
+            ),
+        ]
+
     def close(self):
         """
         Cierra la sesión y calcula la duración total.
         Este método debe llamarse al hacer logout o cerrar sesión desde el frontend.
+
+        El cierre es un único UPDATE condicionado a end_time IS NULL: si otra petición
+        ya cerró la sesión, no se sobrescribe y se retorna 0.0 (así la duración no se
+        suma dos veces a las estadísticas). 'duration' se sigue guardando porque el
+        login usa duration=0 para detectar sesiones aún no contabilizadas.
+
+        Para cerrar sesiones fuera de este método usar el mismo UPDATE condicionado
+        (ver CustomLoginView.post), no bulk_update: este sobrescribe sin condición y
+        una sesión cerrada a la vez por un logout se contabilizaría dos veces.
         """
-        from django.utils import timezone
-        if not self.end_time:                                                               # Solo si aún no se había cerrado
-            self.end_time = timezone.now()                                                  # Registra fin de sesión
-            delta = self.end_time - self.start_time                                         # Calcula diferencia temporal
-            self.duration = delta.total_seconds() / 60.0                                    # Convierte a minutos
-            self.save()                                                                     # Guarda el cambio en BD
-        return self.duration                                                                # Retorna la duración en minutos
+        if self.end_time:                                                                   # Ya estaba cerrada en memoria
+            return self.duration
+        end_time = timezone.now()                                                           # Registra fin de sesión
+        duration = (end_time - self.start_time).total_seconds() / 60.0                      # Diferencia convertida a minutos
+        updated = UserSession.objects.filter(pk=self.pk, end_time__isnull=True).update(    # Un solo UPDATE, sin releer la fila
+            end_time=end_time, duration=duration
+        )
+        if not updated:                                                                     # Otra petición la cerró primero
+            return 0.0
+        self.end_time, self.duration = end_time, duration                                   # Sincroniza la instancia en memoria
+        return duration                                                                     # Retorna la duración en minutos
 
     def __str__(self):
         """Devuelve una representación legible de la sesión."""
@@ -0,0 +1,74 @@
+# ======================================================================================
+# Archivo: renderers.py
+# Ubicación: backend/interfaz/
+#
+# Descripción general:
+# --------------------------------------------------------------------------------------
+# Este módulo define el renderer JSON basado en orjson y una negociación de contenido
+# fija para los endpoints de login y cambio de contraseña, que siempre responden JSON.
+#
+#   - ORJSONRenderer: serializa con orjson (implementado en C) en lugar de json.dumps.
+#   - JSONOnlyNegotiation: devuelve directamente el primer renderer de la vista, sin
+#     analizar el encabezado Accept en cada petición.
+#   - orjson_response: HttpResponse con el JSON ya serializado, para los listados del
+#     Dashboard (se omite por completo el paso por renderers de DRF).
+#
+# Autora: Sara Hernández
+# ======================================================================================
+
+
+# --------------------------------------------------------------------------------------
+# Importaciones necesarias
+# --------------------------------------------------------------------------------------
+import orjson                                                       # Serialización JSON rápida (devuelve bytes)
+from django.http import HttpResponse                                # Respuesta HTTP con el cuerpo ya serializado
+from rest_framework.encoders import JSONEncoder                     # Conversión de tipos especiales de DRF
+from rest_framework.negotiation import DefaultContentNegotiation    # Negociación base (se reutiliza select_parser)
+from rest_framework.renderers import JSONRenderer                   # Renderer JSON estándar de DRF
+
+
+# Tipos que orjson no conoce (textos traducibles, Decimal, timedelta, QuerySet...)
+# se convierten igual que en el encoder de DRF.
+_DRF_DEFAULT = JSONEncoder().default
+_ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+# ======================================================================================
+# CLASE: ORJSONRenderer
+# --------------------------------------------------------------------------------------
+# Mismo media type y formato que JSONRenderer, pero serializado con orjson.
+# OPT_UTC_Z escribe las fechas UTC con "Z", igual que el encoder de DRF.
+# ======================================================================================
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=_DRF_DEFAULT, option=_ORJSON_OPTIONS)
+
+
+# ======================================================================================
+# CLASE: JSONOnlyNegotiation
+# --------------------------------------------------------------------------------------
+# Las vistas que la usan declaran un único renderer: se selecciona sin comparar
+# el encabezado Accept (tampoco se responde 406 a clientes con Accept genérico).
+# ======================================================================================
+class JSONOnlyNegotiation(DefaultContentNegotiation):
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderer = renderers[0]
+        return renderer, renderer.media_type
+
+
+# ======================================================================================
+# FUNCIÓN: orjson_response
+# --------------------------------------------------------------------------------------
+# Para vistas APIView que ya construyen listas de diccionarios simples: el cuerpo se
+# serializa una sola vez con orjson y DRF devuelve el HttpResponse tal cual (sin
+# negociación ni renderer). La autenticación y los permisos de la vista se aplican
+# igual que siempre.
+# ======================================================================================
+def orjson_response(data, status=200):
+    return HttpResponse(
+        orjson.dumps(data, default=_DRF_DEFAULT, option=_ORJSON_OPTIONS),
+        status=status,
+        content_type='application/json',
+    )
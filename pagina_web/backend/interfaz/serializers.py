@@ -24,12 +24,81 @@
 # --------------------------------------------------------------------------------------
 # Importaciones necesarias
 # --------------------------------------------------------------------------------------
+import os                                                                   # Número de CPUs para el pool de hashing
+from functools import cache, cached_property                                # Resultados/atributos calculados una sola vez
+from concurrent.futures import ThreadPoolExecutor                           # Hashing de contraseñas en paralelo (altas masivas)
 from rest_framework import serializers                                      # Base del sistema de serialización DRF
+from django.contrib.auth.hashers import check_password, make_password       # Hash/verificación sin instancia de usuario
+from django.utils.crypto import get_random_string                          # Contraseña aleatoria para el hash señuelo
 from django.contrib.auth import password_validation                         # Validadores de contraseñas de Django
 from django.utils.translation import gettext_lazy as _                      # Soporte multilenguaje (mensajes traducibles)
+from django.db.models.functions import Lower                                # LOWER(email) para usar el índice funcional
 from .models import UsuarioPersonalizado                                    # Importamos el modelo de usuario
 
 
+@cache
+def _dummy_hash():
+    """
+    Hash señuelo con el hasher por defecto, calculado una sola vez por proceso.
+    Verificar contra él cuando el correo no existe hace que esa respuesta tarde lo
+    mismo que una contraseña incorrecta (no se puede saber por tiempo si el usuario
+    existe) sin generar un hash nuevo en cada intento.
+    """
+    return make_password(get_random_string(32))
+
+
+# ======================================================================================
+# CLASE: LowerEmailField
+# --------------------------------------------------------------------------------------
+# EmailField que entrega el correo ya normalizado (sin espacios y en minúsculas),
+# así la normalización ocurre una sola vez al validar el campo.
+# La validación de formato sigue siendo el EmailValidator de Django: sus regex se
+# compilan una vez y, con el límite de 320 caracteres que aplica antes, el costo es
+# de microsegundos frente al hash de la contraseña del mismo request.
+# ======================================================================================
+class LowerEmailField(serializers.EmailField):
+    def to_internal_value(self, data):
+        return super().to_internal_value(data).strip().lower()
+
+
+# ======================================================================================
+# CLASE: UsuarioListSerializer
+# --------------------------------------------------------------------------------------
+# Alta masiva de usuarios (POST /api/usuarios/ con una lista de objetos).
+# El hash de cada contraseña es la parte costosa: se calcula en paralelo en un pool
+# de hilos (el hasher libera el GIL) y luego se insertan todos con bulk_create en
+# lotes de 500, en lugar de un INSERT y un hash en serie por usuario.
+# El pool se limita a _HASH_WORKERS hilos: cada hash Argon2 ya usa 2 hilos y 64 MiB.
+# ======================================================================================
+_HASH_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class UsuarioListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        # UniqueValidator solo compara contra la base de datos: un correo repetido
+        # dentro de la misma lista llegaría a bulk_create como IntegrityError.
+        # Se compara en minúsculas, igual que el índice único Lower('email').
+        seen = set()
+        for item in attrs:
+            email = (item.get('email') or '').lower()
+            if email in seen:
+                raise serializers.ValidationError({'email': f'Correo repetido en la lista: {email}'})
+            seen.add(email)
+        return attrs
+
+    def create(self, validated_data):
+        passwords = [item.pop('password', None) for item in validated_data]
+        if not all(passwords):
+            raise serializers.ValidationError({'password': 'Password is required.'})
+        with ThreadPoolExecutor(max_workers=_HASH_WORKERS) as pool:
+            hashes = list(pool.map(make_password, passwords))
+        users = [
+            UsuarioPersonalizado(**item, password=hashed)
+            for item, hashed in zip(validated_data, hashes)
+        ]
+        return UsuarioPersonalizado.objects.bulk_create(users, batch_size=500)
+
+
 # ======================================================================================
 # CLASE: UsuarioSerializer
 # --------------------------------------------------------------------------------------
@@ -44,12 +113,14 @@ class UsuarioSerializer(serializers.ModelSerializer):
     class Meta:
         model = UsuarioPersonalizado
         # Campos expuestos en la API
-        fields = [
+        fields = (
             'id', 'nombre', 'email', 'rol', 'is_active', 'last_login', 'password',
             'must_change_password', 'password_changed_at'
-        ]
+        )
         # Campos que no pueden ser modificados directamente
-        read_only_fields = ['id', 'last_login', 'password_changed_at']
+        read_only_fields = ('id', 'last_login', 'password_changed_at')
+        # Serializador usado con many=True (altas masivas)
+        list_serializer_class = UsuarioListSerializer
 
     # ------------------------------------------------------------------
     # Crear un nuevo usuario (modo administrador)
@@ -93,28 +164,38 @@ class PasswordChangeSerializer(serializers.Serializer):
     new_password = serializers.CharField(write_only=True)                   # Nueva contraseña
 
     # -------------------------------------------------------------
-    # Validación de la contraseña actual (old_password)
+    # Usuario autenticado (se resuelve una sola vez por serializer)
     # -------------------------------------------------------------
-    def validate_old_password(self, value):
-        user = self.context['request'].user                                 # Usuario autenticado
-        if not user.check_password(value):                                  # Verificamos que coincida
-            raise serializers.ValidationError(_('La contraseña actual no es correcta.'))
-        return value
+    @cached_property
+    def _user(self):
+        return self.context['request'].user
 
     # -------------------------------------------------------------
-    # Validaciones generales del nuevo password
+    # Validación de la contraseña actual y del nuevo password
     # -------------------------------------------------------------
+    # La contraseña actual se verifica aquí (y no en validate_old_password) para
+    # poder rechazar primero el caso "nueva == actual" sin pagar el hash.
+    # Nota: check_password se mantiene síncrono. Django 5 ofrece acheck_password,
+    # pero DRF (3.16) no admite validate/validate_<campo> asíncronos ni APIView
+    # async: un "async def validate" devolvería una corrutina sin ejecutar y la
+    # validación pasaría siempre.
     def validate(self, attrs):
-        user = self.context['request'].user                                 # Usuario autenticado
+        user = self._user                                                   # Usuario autenticado
         new_password = attrs.get('new_password')
 
-        # Evita que la nueva contraseña sea igual a la anterior
+        # Evita que la nueva contraseña sea igual a la anterior (comparación barata, va primero)
         if new_password == attrs.get('old_password'):
             raise serializers.ValidationError({
                 'new_password': _('La nueva contraseña debe ser diferente a la actual.')
             })
 
-        # Aplicamos validadores estándar de Django (longitud, fortaleza, etc.)
+        # Verificamos que la contraseña actual coincida (cálculo del hash)
+        if not user.check_password(attrs.get('old_password')):
+            raise serializers.ValidationError({'old_password': _('La contraseña actual no es correcta.')})
+
+        # Aplicamos validadores estándar de Django (longitud, fortaleza, etc.).
+        # Sin password_validators, Django usa get_default_password_validators(),
+        # que ya está cacheada: los validadores se instancian una sola vez por proceso.
         password_validation.validate_password(password=new_password, user=user)
         return attrs
 
@@ -122,12 +203,9 @@ class PasswordChangeSerializer(serializers.Serializer):
     # Guardar el nuevo password
     # -------------------------------------------------------------
     def save(self, **kwargs):
-        user = self.context['request'].user                                 # Usuario autenticado
+        user = self._user                                                   # Usuario autenticado
         new_password = self.validated_data['new_password']                  # Nueva contraseña validada
-        user.set_password(new_password)                                     # Hash de la nueva contraseña
-        user.must_change_password = False                                   # Desactiva flag de cambio obligatorio
-        user.mark_password_changed()                                        # Registra timestamp de cambio
-        user.save()                                                         # Guarda en BD
+        user.apply_new_password(new_password)                               # Hash + flags + timestamp en un solo UPDATE
         return user
 
 
@@ -140,7 +218,7 @@ class PasswordChangeSerializer(serializers.Serializer):
 # Body esperado: { "email": "...", "old_password": "...", "new_password": "..." }
 # ======================================================================================
 class PasswordDirectChangeSerializer(serializers.Serializer):
-    email = serializers.EmailField()                                        # Email del usuario
+    email = LowerEmailField()                                               # Email del usuario (ya en minúsculas)
     old_password = serializers.CharField(write_only=True)                   # Contraseña actual
     new_password = serializers.CharField(write_only=True)                   # Nueva contraseña
 
@@ -148,26 +226,36 @@ class PasswordDirectChangeSerializer(serializers.Serializer):
     # Validación completa de credenciales y nueva contraseña
     # -------------------------------------------------------------
     def validate(self, attrs):
-        email = (attrs.get('email') or '').strip().lower()                  # Normaliza email
+        email = attrs['email']                                              # Normalizado por LowerEmailField
         old_password = attrs.get('old_password')
         new_password = attrs.get('new_password')
 
-        # Intentamos obtener el usuario de la base de datos (case-insensitive)
+        # Intentamos obtener el usuario de la base de datos (case-insensitive).
+        # LOWER(email) = email coincide con el índice usr_email_lower_idx (email__iexact
+        # genera UPPER(...) o LIKE y no lo usaría). only() trae solo las columnas que
+        # usan validate() y save().
         try:
-            user = UsuarioPersonalizado.objects.get(email__iexact=email)
+            user = (
+                UsuarioPersonalizado.objects
+                .alias(email_lower=Lower('email'))
+                .only('id', 'email', 'password', 'is_active', 'must_change_password')
+                .get(email_lower=email)
+            )
         except UsuarioPersonalizado.DoesNotExist:
+            # Mismo costo que verificar una contraseña real (ver _dummy_hash)
+            check_password(old_password, _dummy_hash())
             # Mensaje genérico para evitar filtrar si el usuario existe
             raise serializers.ValidationError(_('Credenciales inválidas.'))
 
         if not user.is_active:                                              # El usuario debe estar activo
             raise serializers.ValidationError(_('Usuario inactivo.'))
 
+        if old_password == new_password:                                    # Evita repetir contraseña (antes del hash)
+            raise serializers.ValidationError({'new_password': _('La nueva contraseña debe ser diferente a la actual.')})
+
         if not user.check_password(old_password):                           # Validamos contraseña actual
             raise serializers.ValidationError({'old_password': _('La contraseña actual no es correcta.')})
 
-        if old_password == new_password:                                    # Evita repetir contraseña
-            raise serializers.ValidationError({'new_password': _('La nueva contraseña debe ser diferente a la actual.')})
-
         # Validación de políticas de contraseñas (Django)
         password_validation.validate_password(password=new_password, user=user)
 
@@ -181,10 +269,7 @@ class PasswordDirectChangeSerializer(serializers.Serializer):
     def save(self, **kwargs):
         user = self.validated_data['user']                                  # Usuario validado
         new_password = self.validated_data['new_password']                  # Nueva contraseña
-        user.set_password(new_password)                                     # Set + hash
-        user.must_change_password = False                                   # Limpiamos flag de seguridad
-        user.mark_password_changed()                                        # Timestamp de cambio
-        user.save()                                                         
+        user.apply_new_password(new_password)                               # Hash + flags + timestamp en un solo UPDATE
         return user
 
 
@@ -197,12 +282,13 @@ class PasswordDirectChangeSerializer(serializers.Serializer):
 from .models import LoginRecord, UserStatistic
 
 class LoginRecordSerializer(serializers.ModelSerializer):
-    # Relación mostrada como cadena (usa __str__ del modelo)
-    usuario = serializers.StringRelatedField()
+    # Nombre del usuario leído de la fila ya unida con select_related('usuario')
+    # (StringRelatedField llamaba __str__ y con él un SELECT extra por registro)
+    usuario = serializers.SlugRelatedField(slug_field='nombre', read_only=True)
 
     class Meta:
         model = LoginRecord
-        fields = ['usuario', 'timestamp']                                   # Campos visibles en la API
+        fields = ('usuario', 'timestamp')                                   # Campos visibles en la API
 
 
 # ======================================================================================
@@ -212,8 +298,8 @@ class LoginRecordSerializer(serializers.ModelSerializer):
 # por usuario. Permite visualizar métricas o graficar actividad.
 # ======================================================================================
 class UserStatisticSerializer(serializers.ModelSerializer):
-    usuario = serializers.StringRelatedField()                              # Mostrar nombre en lugar de ID
+    usuario = serializers.SlugRelatedField(slug_field='nombre', read_only=True)  # Nombre (requiere select_related)
 
     class Meta:
         model = UserStatistic
-        fields = ['usuario', 'total_time']                                  # Campos incluidos en la API
+        fields = ('usuario', 'total_time')                                  # Campos incluidos en la API
@@ -68,9 +68,13 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token = super().get_token(user)   # Llama al método original para generar el token base.
 
         # --- Claims personalizados añadidos al token ---
-        token['email'] = user.email                       # Correo del usuario (identificador único).
-        token['nombre'] = getattr(user, 'nombre', '')      # Nombre legible del usuario.
-        token['role'] = getattr(user, 'rol', '')           # Rol del usuario (usamos "role" para mantener consistencia con el frontend).
+        # Se agregan de una vez sobre el payload (un solo update en lugar de tres
+        # __setitem__ que pasan por Token.__setitem__ cada uno).
+        token.payload.update({
+            'email': user.email,                          # Correo del usuario (identificador único).
+            'nombre': user.nombre or '',                  # Nombre legible del usuario.
+            'role': user.rol or '',                       # Rol del usuario (usamos "role" para mantener consistencia con el frontend).
+        })
 
         # Retornamos el token modificado, que ahora contiene los nuevos claims.
         return token
@@ -103,10 +107,12 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         # Si la autenticación fue correcta, el usuario autenticado se almacena en self.user.
         user = self.user
 
-        # --- Datos extra añadidos a la respuesta JSON final ---
-        data['email'] = user.email                        # Correo electrónico del usuario.
-        data['nombre'] = getattr(user, 'nombre', '')       # Nombre visible del usuario.
-        data['role'] = getattr(user, 'rol', '')            # Rol del usuario en la plataforma.
+        # --- Datos extra añadidos a la respuesta JSON final (un solo update) ---
+        data.update({
+            'email': user.email,                          # Correo electrónico del usuario.
+            'nombre': user.nombre or '',                  # Nombre visible del usuario.
+            'role': user.rol or '',                       # Rol del usuario en la plataforma.
+        })
 
         # Retornamos el diccionario final que incluye los tokens y la información adicional.
         return data
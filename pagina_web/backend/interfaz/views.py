@@ -18,6 +18,11 @@ from django.contrib.auth import authenticate  # Función para autenticar credenc
 from django.http import JsonResponse          # Permite devolver respuestas JSON
 from django.views.decorators.csrf import csrf_exempt  # Desactiva protección CSRF en vistas específicas
 import json                                   # Librería estándar para manejar datos JSON
+import queue                                  # Cola de registros de login pendientes
+import threading                              # Hilo que escribe los registros de login
+import time                                   # Espera entre reintentos del hilo de logins
+import logging                                # Registro de los logins que no se pudieron guardar
+from django.db import close_old_connections, transaction, OperationalError  # Conexión del hilo de fondo, transacciones y errores de BD
 
 # === Django REST Framework ===
 from rest_framework import viewsets, permissions                 # Clases base para vistas y control de permisos
@@ -32,19 +37,94 @@ from .serializers import (
     UsuarioSerializer,                   # Serializador principal de usuario
     PasswordChangeSerializer,            # Serializador para cambio de contraseña con JWT
     PasswordDirectChangeSerializer,      # Serializador para cambio de contraseña con credenciales
-    LoginRecordSerializer,               # Serializador de registros de inicio de sesión
-    UserStatisticSerializer,             # Serializador de estadísticas de uso
 )
 from .serializers_jwt import CustomTokenObtainPairSerializer  # Serializer JWT personalizado
+from .renderers import ORJSONRenderer, JSONOnlyNegotiation, orjson_response  # Respuestas JSON con orjson, sin negociar Accept
 
 # === JWT Login View ===
 from rest_framework_simplejwt.views import TokenObtainPairView  # Vista base de SimpleJWT para obtención de tokens
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError  # Errores de validación de tokens
 
 # === Utilidades ===
-from datetime import datetime             # Manejo de fechas y tiempos
+from datetime import datetime, time as dt_time, timedelta  # Manejo de fechas y tiempos
 from django.utils import timezone          # Fechas y horas conscientes de zona horaria
 from .models import UserSession, UserStatistic  # Modelos de sesiones y estadísticas
-from copy import deepcopy                  # Permite clonar objetos sin modificar los originales
+from django.db.models import F, Prefetch   # Referencias a columnas y prefetch con filtro
+
+
+# ---------------------------------------------------------------------
+# REGISTRO DE LOGINS EN SEGUNDO PLANO
+# El INSERT de LoginRecord no bloquea la respuesta del login: el ID del
+# usuario se encola y un único hilo lo escribe, agrupando en un solo
+# bulk_create todos los logins que se acumularon mientras tanto.
+# (Si el proceso termina, los registros aún en cola se pierden.)
+#
+# Con SQLite, el INSERT puede chocar con la transacción del propio login
+# ("database is locked"): los errores operacionales se reintentan con
+# espera creciente antes de descartar el lote. Los lotes descartados se
+# registran en el logger con los IDs de usuario para poder auditarlos.
+# ---------------------------------------------------------------------
+_LOGIN_QUEUE = queue.SimpleQueue()   # IDs de usuario pendientes de registrar
+_LOGIN_BATCH = 100                   # Máximo de registros por INSERT
+_LOGIN_RETRIES = 5                   # Intentos por lote ante errores operacionales (BD bloqueada)
+_LOGIN_RETRY_DELAY = 0.2             # Segundos antes del primer reintento (se duplica en cada uno)
+_LOGIN_THREAD = None                 # Hilo escritor; se crea con el primer login (no al importar)
+_LOGIN_THREAD_LOCK = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def _save_login_batch(ids):
+    """Guarda el lote con bulk_create, reintentando si la base de datos está ocupada."""
+    delay = _LOGIN_RETRY_DELAY
+    for attempt in range(1, _LOGIN_RETRIES + 1):
+        try:
+            close_old_connections()
+            LoginRecord.objects.bulk_create([LoginRecord(usuario_id=uid) for uid in ids])
+            return
+        except OperationalError as e:
+            if attempt == _LOGIN_RETRIES:
+                logger.error("[LOGIN] Se descartaron %d registros de login tras %d intentos (%s). usuario_id: %s",
+                             len(ids), attempt, e, ids)
+                return
+            logger.warning("[LOGIN] Intento %d de guardar %d registros de login falló (%s); reintentando.",
+                           attempt, len(ids), e)
+            time.sleep(delay)
+            delay *= 2
+        except Exception as e:
+            logger.error("[LOGIN] No se pudieron guardar %d registros de login (%s). usuario_id: %s",
+                         len(ids), e, ids)
+            return
+
+
+def _login_writer():
+    while True:
+        ids = [_LOGIN_QUEUE.get()]                       # Espera el primer login
+        while len(ids) < _LOGIN_BATCH:                   # Toma los que ya estén en cola
+            try:
+                ids.append(_LOGIN_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        _save_login_batch(ids)
+
+
+def _start_login_writer():
+    """
+    Arranca el hilo escritor una sola vez. Se hace en el primer login y no al
+    importar el módulo, para que migrate, shell o los checks no creen el hilo.
+    """
+    global _LOGIN_THREAD
+    with _LOGIN_THREAD_LOCK:
+        if _LOGIN_THREAD is None:
+            _LOGIN_THREAD = threading.Thread(target=_login_writer, name="login-records", daemon=True)
+            _LOGIN_THREAD.start()
+
+
+def _record_login(user):
+    """Encola el registro de login del usuario (no toca la base de datos)."""
+    if _LOGIN_THREAD is None:                            # Solo el primer login toma el lock
+        _start_login_writer()
+    _LOGIN_QUEUE.put(user.pk)
 
 
 # ---------------------------------------------------------------------
@@ -69,9 +149,11 @@ def login_view(request):
             if not user.is_active:                           # Verifica que el usuario esté activo
                 return JsonResponse({'error': 'Usuario inactivo.'}, status=403)
 
-            LoginRecord.objects.create(usuario=user)         # Registra el inicio de sesión
+            _record_login(user)                              # Registra el inicio de sesión (en segundo plano)
             hoy = timezone.localdate()                       # Obtiene la fecha local actual
-            UserStatistic.objects.get_or_create(usuario=user, date=hoy)  # Crea estadística si no existe
+            # Crea la estadística del día si no existe: un solo INSERT que la base de datos
+            # ignora si ya hay fila (usuario, date), en lugar de SELECT + INSERT.
+            UserStatistic.objects.bulk_create([UserStatistic(usuario=user, date=hoy)], ignore_conflicts=True)
 
             return JsonResponse({
                 'mensaje': 'Inicio de sesión exitoso',
@@ -92,54 +174,75 @@ def login_view(request):
 # ---------------------------------------------------------------------
 class CustomLoginView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer        # Usa el serializer JWT personalizado
+    renderer_classes = [ORJSONRenderer]                       # Siempre responde JSON (orjson)
+    content_negotiation_class = JSONOnlyNegotiation           # Sin análisis del encabezado Accept
 
     def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)     # Llama a la autenticación JWT estándar
-
-        if response.status_code == 200:                       # Si el login fue exitoso
-            email = request.data.get('email')
-            try:
-                user = UsuarioPersonalizado.objects.get(email=email)
-                UserSession.objects.filter(usuario=user, end_time__isnull=True).update(end_time=timezone.now())
-
-                for session in UserSession.objects.filter(usuario=user, end_time__isnull=False, duration=0):
-                    delta = session.end_time - session.start_time
-                    duration = delta.total_seconds() / 60.0
-                    session.duration = duration
-                    session.save()
-
-                    hoy = timezone.localdate()
-                    stat, _ = UserStatistic.objects.get_or_create(usuario=user, date=hoy)
-                    stat.total_time += duration
-                    stat.save()
-
-                LoginRecord.objects.create(usuario=user)       # Registra el nuevo login
-                UserSession.objects.create(usuario=user)       # Crea una nueva sesión activa
-
-                if isinstance(response.data, dict):            # Añade el rol al JSON de respuesta
-                    response.data['role'] = getattr(user, 'rol', '')
-
-            except UsuarioPersonalizado.DoesNotExist:
-                pass
-
-        return response
+        # Mismo flujo que TokenObtainPairView.post, pero conservando el serializer:
+        # después de validar, serializer.user es el usuario ya autenticado, así que
+        # no hace falta volver a buscarlo por email.
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)          # Autentica y genera los tokens
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        user = serializer.user
+        now = timezone.now()
+
+        # Sesiones aún no contabilizadas (duration=0): las abiertas se cierran
+        # ahora y su tiempo se suma a la estadística del día con un único UPDATE.
+        # Cada cierre es un UPDATE condicionado (como UserSession.close()): si un
+        # logout simultáneo ya cerró o contabilizó la sesión, no se actualiza y su
+        # duración no se suma dos veces.
+        with transaction.atomic():                             # Lectura y escrituras en un COMMIT
+            total = 0.0
+            for session in UserSession.objects.filter(usuario=user, duration=0).only('id', 'start_time', 'end_time'):
+                if session.end_time is None:
+                    duration = (now - session.start_time).total_seconds() / 60.0
+                    updated = UserSession.objects.filter(pk=session.pk, end_time__isnull=True).update(
+                        end_time=now, duration=duration
+                    )
+                else:
+                    duration = (session.end_time - session.start_time).total_seconds() / 60.0
+                    updated = UserSession.objects.filter(pk=session.pk, duration=0).update(duration=duration)
+                if updated:                                    # Solo lo que cerró esta petición
+                    total += duration
+            if total:
+                UserStatistic.add_time(user, total)
+            UserSession.objects.create(usuario=user)           # Crea una nueva sesión activa
+
+        _record_login(user)                                    # Registra el nuevo login (en segundo plano)
+
+        # validated_data ya incluye access, refresh, email, nombre y role
+        # (ver CustomTokenObtainPairSerializer.validate)
+        return Response(serializer.validated_data, status=200)
 
 
 # ---------------------------------------------------------------------
 # API: CRUD COMPLETO DE USUARIOS (solo admin)
 # ---------------------------------------------------------------------
+_ADMIN_ROLES = frozenset(('admin', 'administrador'))
+
+
 class IsAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
+        # El resultado se guarda en el request: si el permiso se vuelve a evaluar
+        # en la misma petición no se repite la comprobación.
+        cached = getattr(request, '_is_admin', None)
+        if cached is not None:
+            return cached
         user = request.user
         if not user or not user.is_authenticated:
-            return False
-        rol = str(getattr(user, 'rol', '') or '').strip().lower()
-        return (
-            getattr(user, 'is_staff', False)
-            or getattr(user, 'is_superuser', False)
-            or rol == 'admin'
-            or rol == 'administrador'
-        )
+            result = False
+        else:
+            result = bool(
+                user.is_staff
+                or user.is_superuser
+                or user.rol_normalized in _ADMIN_ROLES
+            )
+        request._is_admin = result
+        return result
 
 
 class UsuarioViewSet(viewsets.ModelViewSet):
@@ -147,6 +250,13 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     serializer_class = UsuarioSerializer                          # Usa el serializador de usuarios
     permission_classes = [IsAuthenticated, IsAdmin]               # Solo admins autenticados pueden acceder
 
+    def get_serializer(self, *args, **kwargs):
+        # POST con una lista de usuarios → alta masiva (UsuarioListSerializer).
+        # Solo en create: un PUT/PATCH con lista debe seguir respondiendo 400.
+        if self.action == 'create' and isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
+
 
 # ---------------------------------------------------------------------
 # API: OBTENER EL USUARIO AUTENTICADO
@@ -154,6 +264,9 @@ class UsuarioViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mi_perfil(request):
+    # request.user ya viene de CachedJWTAuthentication (caché de unos segundos), así
+    # que aquí no se consulta la base de datos; un .only() obligaría a una consulta
+    # adicional solo para leer columnas que ya están en memoria.
     usuario = request.user
     return Response({
         'id': usuario.id,
@@ -172,6 +285,8 @@ def mi_perfil(request):
 # ---------------------------------------------------------------------
 class ChangePasswordView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+    content_negotiation_class = JSONOnlyNegotiation
 
     def post(self, request):
         serializer = PasswordChangeSerializer(data=request.data, context={'request': request})
@@ -185,6 +300,8 @@ class ChangePasswordView(APIView):
 # ---------------------------------------------------------------------
 class ChangePasswordWithCredentialsView(APIView):
     permission_classes = [AllowAny]
+    renderer_classes = [ORJSONRenderer]
+    content_negotiation_class = JSONOnlyNegotiation
 
     def post(self, request):
         serializer = PasswordDirectChangeSerializer(data=request.data)
@@ -202,10 +319,21 @@ class LoginRecordListView(APIView):
     permission_classes = [IsAuthenticated, IsAdmin]
 
     def get(self, request):
-        today = timezone.localdate()
-        registros = LoginRecord.objects.filter(timestamp__date=today).order_by('-timestamp')
-        serializer = LoginRecordSerializer(registros, many=True)
-        return Response(serializer.data)
+        # Rango semiabierto [hoy 00:00, mañana 00:00) en la zona local: a diferencia de
+        # timestamp__date (que aplica una conversión sobre la columna), permite usar el
+        # índice de LoginRecord.timestamp en lugar de recorrer toda la tabla.
+        start = timezone.make_aware(datetime.combine(timezone.localdate(), dt_time.min))
+        end = start + timedelta(days=1)
+        # Listado de solo lectura con dos campos: values() devuelve dicts directamente
+        # desde la consulta (un JOIN), sin instanciar modelos ni pasar por el serializer.
+        # Mismas claves que LoginRecordSerializer: {"usuario": nombre, "timestamp": ...}
+        # El SELECT trae solo esas dos columnas: el Dashboard no usa id ni email.
+        registros = (
+            LoginRecord.objects.filter(timestamp__gte=start, timestamp__lt=end)
+            .order_by('-timestamp')
+            .values('timestamp', usuario=F('usuario__nombre'))
+        )
+        return orjson_response(list(registros))                 # SQL → dicts → bytes, sin renderers de DRF
 
 
 # ---------------------------------------------------------------------
@@ -216,18 +344,33 @@ class UserStatisticListView(APIView):
 
     def get(self, request):
         hoy = timezone.localdate()
-        updated_stats = []
-
-        for stat in UserStatistic.objects.filter(date=hoy):
-            active_sessions = UserSession.objects.filter(usuario=stat.usuario, end_time__isnull=True)
-            total_extra = sum((timezone.now() - s.start_time).total_seconds() / 60.0 for s in active_sessions)
-
-            clone = deepcopy(stat)
-            clone.total_time = stat.total_time + total_extra
-            updated_stats.append(clone)
+        now = timezone.now()
+
+        # Dos consultas en total: estadísticas (+ usuario por JOIN) y, en una sola
+        # consulta, las sesiones abiertas de todos esos usuarios.
+        stats = list(
+            UserStatistic.objects.filter(date=hoy)
+            .select_related('usuario')
+            .prefetch_related(Prefetch(
+                'usuario__usersession_set',
+                queryset=UserSession.objects.filter(end_time__isnull=True).only('usuario_id', 'start_time'),
+                to_attr='open_sessions',
+            ))
+        )
 
-        serializer = UserStatisticSerializer(updated_stats, many=True)
-        return Response(serializer.data)
+        # Diccionarios simples con la misma forma que UserStatisticSerializer
+        # (usuario = nombre, total_time en minutos); el tiempo de las sesiones
+        # aún abiertas se suma solo en la respuesta, no se guarda.
+        data = [
+            {
+                'usuario': stat.usuario.nombre,
+                'total_time': stat.total_time + sum(
+                    (now - s.start_time).total_seconds() for s in stat.usuario.open_sessions
+                ) / 60.0,
+            }
+            for stat in stats
+        ]
+        return orjson_response(data)                            # Serializado una sola vez con orjson
 
 
 # ---------------------------------------------------------------------
@@ -242,10 +385,7 @@ class LogoutView(APIView):
 
         if session:
             duration = session.close()
-            hoy = timezone.localdate()
-            stat, _ = UserStatistic.objects.get_or_create(usuario=user, date=hoy)
-            stat.total_time += duration
-            stat.save()
+            UserStatistic.add_time(user, duration)           # UPDATE atómico total_time + duración
         else:
             duration = 0.0
 
@@ -254,6 +394,10 @@ class LogoutView(APIView):
 
 # ======================================================================================
 # Enviar comando MQTT al Pololu
+# --------------------------------------------------------------------------------------
+# Vista síncrona a propósito: DRF (3.16) no soporta APIView/api_view asíncronas, y
+# publish_command no espera la red: con QoS 0 paho solo encola el mensaje y lo envía
+# el hilo del loop MQTT, así que la petición no queda bloqueada por el broker.
 # ======================================================================================
 from mqtt_bridge.mqtt_client import publish_command
 
@@ -29,10 +29,15 @@ como por ejemplo la solicitud de la lista de tópicos MQTT activos.
 # Bibliotecas necesarias
 # ================================================================
 
-import json  # Para decodificar y codificar datos JSON
-from datetime import datetime  # Para formatear timestamps legibles
+import asyncio  # to_thread() para decodificar paquetes grandes fuera del event loop
+import orjson  # Decodificación/codificación JSON en C (mucho más rápida que json en cada paquete)
+import sys  # intern() para los nombres de los mapeos
+import math  # floor() para agrupar timestamps por segundo
+import time  # gmtime() para formatear timestamps legibles
+from types import MappingProxyType  # Vista de solo lectura de los mapeos
 from channels.generic.websocket import AsyncWebsocketConsumer  # Base para Consumers asíncronos de Django Channels
 from .mqtt_client import detected_topics  # Conjunto global de tópicos detectados en tiempo real por mqtt_client.py
+from .mqtt_client import attach_event_loop  # Arranca el reenvío MQTT → Channels en este event loop
 
 
 # ================================================================
@@ -43,20 +48,34 @@ from .mqtt_client import detected_topics  # Conjunto global de tópicos detectad
 # Esto facilita la interpretación en el frontend.
 # ================================================================
 
-SOURCE_MAP = {
-    0:  "ROBOTAT_SERVER",
-    1:  "USER_PC",
-    **{i: f"POLOLU_{i-10:02d}" for i in range(10, 43)},  # Rango 10–42 → POLOLU_00 a POLOLU_32
-    **{i: f"CRAZYFLIE_{i-50:02d}" for i in range(50, 71)},
-    **{i: f"MAXARM_{i-80:02d}" for i in range(80, 101)},
-}
+# Los mapeos son de solo lectura (MappingProxyType) y sus textos se internan con
+# sys.intern: todos los paquetes comparten la misma instancia de cada nombre.
+
+def _source_names():
+    """Genera los pares (código, nombre) de SOURCE_MAP en un solo recorrido."""
+    yield 0, "ROBOTAT_SERVER"
+    yield 1, "USER_PC"
+    for i in range(10, 43):                     # Rango 10–42 → POLOLU_00 a POLOLU_32
+        yield i, f"POLOLU_{i-10:02d}"
+    for i in range(50, 71):                     # Rango 50–70 → CRAZYFLIE_00 a CRAZYFLIE_20
+        yield i, f"CRAZYFLIE_{i-50:02d}"
+    for i in range(80, 101):                    # Rango 80–100 → MAXARM_00 a MAXARM_20
+        yield i, f"MAXARM_{i-80:02d}"
+
+
+def _frozen(pairs):
+    """dict de solo lectura con los nombres internados."""
+    return MappingProxyType({code: sys.intern(name) for code, name in pairs})
+
+
+SOURCE_MAP = _frozen(_source_names())
 
 # Tipo de paquete (DATA, COMMAND, MOCAP)
-PACKET_TYPE_MAP = {0: "DATA", 1: "COMMAND", 2: "MOCAP"}
+PACKET_TYPE_MAP = _frozen({0: "DATA", 1: "COMMAND", 2: "MOCAP"}.items())
 
 
 # Identificadores específicos de comandos o estados
-PACKET_ID_MAP = {
+PACKET_ID_MAP = _frozen({
     0: "STATE",
     1: "SENSOR",
     2: "MESSAGE",
@@ -65,7 +84,112 @@ PACKET_ID_MAP = {
     12: "BACKWARD",
     13: "LEFT",
     14: "RIGHT",
-}
+    300: "MOCAP_FRAME",   # Paquete por frame del publicador MoCap (tópico mocap/frame)
+}.items())
+
+
+def _table(mapping):
+    """Convierte un mapeo {código: texto} en una tupla indexada por el código.
+    Las posiciones sin nombre quedan en None."""
+    arr = [None] * (max(mapping) + 1)
+    for code, name in mapping.items():
+        arr[code] = name
+    return tuple(arr)
+
+
+# Tablas precalculadas: los códigos son enteros pequeños, así que mqtt_message
+# (que se ejecuta por cada paquete) indexa una tupla en lugar de buscar en un dict.
+_SRC_ARR = _table(SOURCE_MAP)        # 101 posiciones (0–100)
+_PTP_ARR = _table(PACKET_TYPE_MAP)   # 3 posiciones
+_PID_ARR = _table(PACKET_ID_MAP)     # 301 posiciones (0–300)
+
+
+# Último segundo formateado: (segundo, texto). Se reemplaza la tupla completa, así
+# que los hilos de _decode_packet nunca leen un segundo con el texto de otro.
+_LAST_PTS = (None, "")
+
+
+def _format_pts(second):
+    """Timestamp UNIX (segundos enteros) → "YYYY-mm-dd HH:MM:SS" en UTC.
+    Los paquetes llegan casi en orden, así que basta con recordar el último segundo;
+    time.gmtime + f-string evita crear un datetime y pasar por strftime."""
+    global _LAST_PTS
+    last_second, last_text = _LAST_PTS
+    if second == last_second:
+        return last_text
+    t = time.gmtime(second)
+    text = (f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d} "
+            f"{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}")
+    _LAST_PTS = (second, text)
+    return text
+
+
+DECODE_IN_THREAD_BYTES = 512   # Tamaño (caracteres) a partir del cual se decodifica en un hilo
+BATCH_WINDOW = 0.02            # Segundos que se acumulan paquetes antes de enviarlos juntos
+BATCH_MAX = 200                # Paquetes máximos por frame WebSocket
+QUEUE_MAX = 2000               # Paquetes pendientes por cliente (si se llena, se descartan)
+
+
+def _decode_packet(payload_raw, topic):
+    """Decodifica un payload MQTT y construye el mensaje para el frontend.
+    Función pura y síncrona: mqtt_message la llama directamente o con asyncio.to_thread."""
+    # --------------------------------------------------------
+    # Decodificación segura del mensaje JSON
+    # --------------------------------------------------------
+
+    try:
+        payload_decoded = orjson.loads(payload_raw)
+    except Exception:
+        # Si no se puede decodificar, se guarda el contenido crudo
+        payload_decoded = {"raw": payload_raw}
+
+    # --------------------------------------------------------
+    # Extracción de campos del paquete
+    # --------------------------------------------------------
+    src = payload_decoded.get("src") #Fuente
+    ptp = payload_decoded.get("ptp") #Tipo de paquete
+    pid = payload_decoded.get("pid") #ID de mensaje o comando 
+    pts = payload_decoded.get("pts") # Timestamp
+    cks = payload_decoded.get("cks", "") #Checksum
+
+    # --------------------------------------------------------
+    # Traducción de códigos numéricos a texto descriptivo
+    # --------------------------------------------------------
+    # (solo códigos enteros dentro de la tabla; cualquier otro valor se conserva)
+    if type(src) is int and 0 <= src < len(_SRC_ARR):
+        payload_decoded["src"] = _SRC_ARR[src] or src
+    if type(ptp) is int and 0 <= ptp < len(_PTP_ARR):
+        payload_decoded["ptp"] = _PTP_ARR[ptp] or ptp
+    if type(pid) is int and 0 <= pid < len(_PID_ARR):
+        payload_decoded["pid"] = _PID_ARR[pid] or pid
+
+    # === Timestamp === (el formato solo muestra segundos: se cachea por segundo)
+    try:
+        payload_decoded["pts"] = _format_pts(math.floor(pts))
+    except Exception:
+        payload_decoded["pts"] = str(pts)
+
+    # --------------------------------------------------------
+    # Reducción del tamaño del checksum (si es demasiado largo)
+    # -------------------------------------------------------
+    if isinstance(cks, str) and len(cks) > 12:
+        payload_decoded["cks"] = f"{cks[:8]}…{cks[-4:]}" # Muestra los primeros 8 y últimos 4 caracteres
+
+
+    # --------------------------------------------------------
+    # Construcción del mensaje final a enviar al frontend
+    # --------------------------------------------------------
+    data = {
+        "type": "mqtt_message", # Tipo de evento (para el frontend)
+        "topic": topic,  # Tópico MQTT original
+        "packet": payload_decoded,  #Datos decodificados y formateados
+    }
+    return data
+
+
+def _decode_packets(messages):
+    """_decode_packet para cada (topic, payload) de un lote, en orden."""
+    return [_decode_packet(payload, topic) for topic, payload in messages]
 
 
 # ================================================================
@@ -93,9 +217,16 @@ class MqttConsumer(AsyncWebsocketConsumer):
         # Agrega este cliente al grupo
         await self.channel_layer.group_add(self.group_name, self.channel_name)
 
+        # Asegura que la tarea de reenvío de mqtt_client corra en este loop
+        attach_event_loop()
+
         # Acepta la conexión WebSocket entrante
         await self.accept()
 
+        # Cola de paquetes pendientes y tarea que los envía en lotes (ver _flush_loop)
+        self._queue = asyncio.Queue(maxsize=QUEUE_MAX)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
         # Mensaje de depuración en consola
         print("[WS] Cliente conectado al canal MQTT.")
 
@@ -109,6 +240,11 @@ class MqttConsumer(AsyncWebsocketConsumer):
         # Elimina este cliente del grupo de broadcast
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
+        # Detiene la tarea de envío por lotes (si la conexión llegó a aceptarse)
+        flush_task = getattr(self, "_flush_task", None)
+        if flush_task is not None:
+            flush_task.cancel()
+
 
          # Elimina este cliente del grupo de broadcast
         print("[WS] Cliente desconectado del canal MQTT.")
@@ -119,7 +255,7 @@ class MqttConsumer(AsyncWebsocketConsumer):
 
     async def receive(self, text_data):
         """Procesa los mensajes entrantes desde el frontend (formato JSON)."""
-        data = json.loads(text_data)
+        data = orjson.loads(text_data)
 
         # --- Si el frontend pide la lista de tópicos activos ---
         if data.get("action") == "list_topics":
@@ -127,10 +263,10 @@ class MqttConsumer(AsyncWebsocketConsumer):
             topics = sorted(list(detected_topics))
 
             # Envía la lista al cliente en formato JSON
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=orjson.dumps({
                 "type": "topics_list",
                 "topics": topics
-            }))
+            }).decode())
             return
 
         # --- Si el mensaje no coincide con ninguna acción conocida ---
@@ -147,57 +283,73 @@ class MqttConsumer(AsyncWebsocketConsumer):
         topic = event.get("topic", "")  
         payload_raw = event.get("payload", "")
 
-        # --------------------------------------------------------
-        # Decodificación segura del mensaje JSON
-        # --------------------------------------------------------
+        # Los paquetes pequeños (telemetría) se procesan aquí mismo: pasar a otro
+        # hilo costaría más que decodificarlos. Los grandes (snapshots de MoCap con
+        # muchos marcadores) se procesan en un hilo para no frenar el event loop,
+        # que atiende a todos los demás clientes WebSocket.
+        if len(payload_raw) > DECODE_IN_THREAD_BYTES:
+            data = await asyncio.to_thread(_decode_packet, payload_raw, topic)
+        else:
+            data = _decode_packet(payload_raw, topic)
 
+        self._enqueue(data)
+
+    # ------------------------------------------------------------
+    # Lote de mensajes MQTT (event type = 'mqtt_messages').
+    # mqtt_client.py agrupa lo recibido en cada intervalo (~30 Hz) en
+    # un solo evento: {"messages": [(topic, payload), ...]}
+    # ------------------------------------------------------------
+    async def mqtt_messages(self, event):
+        """Procesa un lote de mensajes MQTT y los encola para el frontend."""
+        messages = event.get("messages", ())
+
+        # Mismo criterio que mqtt_message, aplicado al lote completo: un solo
+        # salto de hilo si en total hay mucho que decodificar.
+        if sum(len(payload) for _, payload in messages) > DECODE_IN_THREAD_BYTES:
+            decoded = await asyncio.to_thread(_decode_packets, messages)
+        else:
+            decoded = _decode_packets(messages)
+
+        for data in decoded:
+            self._enqueue(data)
+
+    def _enqueue(self, data):
+        """Encola un paquete ya decodificado para _flush_loop."""
+        # No se envía de inmediato: se encola y _flush_loop lo manda junto con los
+        # demás paquetes que lleguen en la misma ventana de BATCH_WINDOW segundos.
+        # Si el cliente no da abasto y la cola se llena, el paquete se descarta
+        # (es un monitor en vivo: importa más lo reciente que lo atrasado).
         try:
-            payload_decoded = json.loads(payload_raw)
-        except Exception:
-            # Si no se puede decodificar, se guarda el contenido crudo
-            payload_decoded = {"raw": payload_raw}
-
-        # --------------------------------------------------------
-        # Extracción de campos del paquete
-        # --------------------------------------------------------
-        src = payload_decoded.get("src") #Fuente
-        ptp = payload_decoded.get("ptp") #Tipo de paquete
-        pid = payload_decoded.get("pid") #ID de mensaje o comando 
-        pts = payload_decoded.get("pts") # Timestamp
-        cks = payload_decoded.get("cks", "") #Checksum
-
-        # --------------------------------------------------------
-        # Traducción de códigos numéricos a texto descriptivo
-        # --------------------------------------------------------
-        if src in SOURCE_MAP:
-            payload_decoded["src"] = SOURCE_MAP[src]
-        if ptp in PACKET_TYPE_MAP:
-            payload_decoded["ptp"] = PACKET_TYPE_MAP[ptp]
-        if pid in PACKET_ID_MAP:
-            payload_decoded["pid"] = PACKET_ID_MAP[pid]
-
-        # === Timestamp ===
-        try:
-            payload_decoded["pts"] = datetime.utcfromtimestamp(pts).strftime("%Y-%m-%d %H:%M:%S")
-        except Exception:
-            payload_decoded["pts"] = str(pts)
-
-        # --------------------------------------------------------
-        # Reducción del tamaño del checksum (si es demasiado largo)
-        # -------------------------------------------------------
-        if isinstance(cks, str) and len(cks) > 12:
-            payload_decoded["cks"] = f"{cks[:8]}…{cks[-4:]}" # Muestra los primeros 8 y últimos 4 caracteres
-
-
-        # --------------------------------------------------------
-        # Construcción del mensaje final a enviar al frontend
-        # --------------------------------------------------------
-        data = {
-            "type": "mqtt_message", # Tipo de evento (para el frontend)
-            "topic": topic,  # Tópico MQTT original
-            "packet": payload_decoded,  #Datos decodificados y formateados
-        }
-
-        # Envía el mensaje JSON al cliente WebSocket correspondiente
-        await self.send(text_data=json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            pass
+
+    # ------------------------------------------------------------
+    # Envío por lotes hacia el frontend
+    # ------------------------------------------------------------
+    async def _flush_loop(self):
+        """Agrupa los paquetes encolados y los envía en un solo frame WebSocket.
+
+        Con muchos paquetes por segundo, un frame por paquete significa un
+        orjson.dumps y un send() por cada uno; así se hace uno por ventana.
+        Un paquete suelto se envía como "mqtt_message" (formato de siempre) y
+        varios como {"type": "mqtt_batch", "packets": [...]}.
+        """
+        queue = self._queue
+        while True:
+            first = await queue.get()              # Espera sin consumir CPU hasta el primer paquete
+            await asyncio.sleep(BATCH_WINDOW)      # Deja que lleguen los demás de la ventana
+
+            packets = [first]
+            while len(packets) < BATCH_MAX and not queue.empty():
+                packets.append(queue.get_nowait())
+
+            # orjson ya produce JSON compacto en UTF-8 (equivale a ensure_ascii=False y
+            # separators=(',', ':')); se decodifica a str para seguir enviando frames de
+            # texto, que es lo que espera el frontend.
+            if len(packets) == 1:
+                message = first
+            else:
+                message = {"type": "mqtt_batch", "packets": packets}
+            await self.send(text_data=orjson.dumps(message).decode())
 
@@ -29,13 +29,22 @@ normal del servidor Django.
 # ================================================================
 # Importaciones necesarias
 # ================================================================
-import json    # Para codificar y decodificar mensajes en formato JSON
-import threading  # Permite ejecutar el cliente MQTT en un hilo separado
-import time       # Usado para pequeños retrasos de control
+import asyncio  # Tarea que reenvía los mensajes dentro del event loop ASGI
+import logging  # Registro por mensaje (solo en nivel DEBUG)
+import os       # PID del proceso para el client_id
+import socket   # Opciones del socket TCP del cliente MQTT
+from collections import deque  # Mensajes pendientes entre el hilo de Paho y el loop ASGI
+import orjson  # Codificación JSON en C para los comandos publicados
+import struct  # Decodificación de los paquetes MoCap binarios
+import zlib    # CRC-32 de los paquetes MoCap binarios
 import paho.mqtt.client as mqtt  # Biblioteca principal para conexión con el broker MQTT
-from asgiref.sync import async_to_sync  # Convierte funciones async en llamadas síncronas (para Channels)
 from channels.layers import get_channel_layer  # Acceso al canal interno de Django Channels
 
+# Registro de cada mensaje recibido. print() toma el lock de stdout en el hilo de
+# Paho por cada mensaje; con logging y el nivel en DEBUG apagado (por defecto) no
+# se formatea ni se escribe nada.
+logger = logging.getLogger("mqtt_bridge")
+
 # ---------------------------------------------------------------
 # Parámetros del broker
 # ---------------------------------------------------------------
@@ -44,19 +53,117 @@ PORT   = 1880               # Puerto del broker MQTT
 TOPIC  = "mocap/#"          # Mantiene compatibilidad con la versión original
 QOS    = 0                  # Nivel de servicio (QoS = 0; sin confirmación)
 
+# ---------------------------------------------------------------
+# Buffers del cliente (tolerancia a ráfagas)
+# ---------------------------------------------------------------
+SOCKET_SNDBUF  = 256 * 1024  # Bytes del buffer de envío TCP (SO_SNDBUF)
+MAX_INFLIGHT   = 100         # Mensajes QoS>0 sin confirmar a la vez
+MAX_QUEUED     = 1000        # Mensajes en la cola de salida de Paho (0 = sin límite)
+
+# ---------------------------------------------------------------
+# Identidad y reconexión
+# ---------------------------------------------------------------
+CLIENT_ID           = f"robotat-django-{os.getpid()}"  # Identifica al servidor en los logs del broker
+RECONNECT_MIN_DELAY = 1    # Segundos antes del primer reintento de conexión
+RECONNECT_MAX_DELAY = 30   # Tope de la espera entre reintentos (se duplica en cada uno)
+
 # ---------------------------------------------------------------
 # Tópicos específicos del robot Pololu
 # ---------------------------------------------------------------
 COMMAND_TOPIC   = "pololu01/cmd"   # Tópico donde se publican comandos al robot
 TELEMETRY_TOPIC = "pololu01/tel"   # Tópico donde el robot publica telemetría
 
+# ---------------------------------------------------------------
+# Paquetes MoCap binarios (publisher_MQTT_final.py con WIRE_FORMAT = "binary")
+# ---------------------------------------------------------------
+MOCAP_BINARY_TOPIC = "mocap/bin"            # Tópico de los paquetes binarios
+MOCAP_BODY = struct.Struct("<BdBHH7f")      # src, pts, ptp, pid, psb, x y z qx qy qz qw (sin checksum)
+
 # ================================================================
 # Variables globales
 # ===============================================================
 detected_topics = set()  # Conjunto que almacena los tópicos detectados dinámicamente
+_last_topic = None       # Último tópico registrado (atajo: casi siempre se repite)
 
 mqtt_client_instance = None  # Variable que contendrá la instancia del cliente MQTT activo
 
+# (loop, evento) del reenvío hacia Channels; None hasta que se conecta el primer
+# cliente WebSocket (antes de eso no hay nadie en el grupo "mqtt_logs").
+# Se guarda como una sola tupla para que el hilo de Paho la lea de forma atómica.
+_pump_target = None
+
+_pending = deque(maxlen=5000)  # (tópico, payload) por reenviar; si se llena, se descartan los más viejos
+FLUSH_INTERVAL = 1 / 30        # Segundos mínimos entre envíos al grupo (≤ 30 por segundo)
+
+# Evento que _pump entrega a group_send; se reutiliza en cada lote. Es seguro porque
+# el channel layer copia el mensaje al encolarlo (InMemory: deepcopy; Redis:
+# msgpack) y _pump espera a que group_send termine antes de volver a modificarlo.
+_EVENT = {
+    "type": "mqtt_messages",  # Nombre del evento manejado por consumers.py
+    "messages": None,         # [(tópico, payload), ...] en orden de llegada
+}
+_wakeup_pending = False        # True mientras ya hay un despertar de _pump programado en el loop
+
+
+# ---------------------------------------------------------------
+# Reenvío MQTT → Channels dentro del event loop ASGI
+# ---------------------------------------------------------------
+# Antes, on_message llamaba async_to_sync(group_send) por cada mensaje, lo que
+# crea un contexto de event loop nuevo en el hilo de Paho cada vez. Ahora el
+# hilo de Paho solo agrega (tópico, payload) a _pending y una única tarea de
+# larga duración (_pump) hace los group_send de forma nativa en el loop ASGI.
+#
+# Cruzar del hilo de Paho al loop (call_soon_threadsafe) solo ocurre una vez
+# por ráfaga: mientras _pump no haya atendido el despertar anterior, los
+# mensajes nuevos se agregan a _pending sin volver a despertar el loop.
+#
+# Además, _pump envía a lo sumo un evento cada FLUSH_INTERVAL: todo lo que llegó
+# en ese intervalo viaja en un solo "mqtt_messages". El MoCap publica a 120 Hz o
+# más, pero el panel del navegador no necesita más de ~30 actualizaciones/s.
+def attach_event_loop():
+    """
+    Arranca la tarea de reenvío en el event loop que está corriendo (el del
+    servidor ASGI). Se llama desde MqttConsumer.connect(); si la tarea ya corre
+    en este loop, no hace nada.
+    """
+    global _pump_target, _wakeup_pending
+    loop = asyncio.get_running_loop()
+    if _pump_target is not None and _pump_target[0] is loop:
+        return
+    wakeup = asyncio.Event()
+    # El evento arranca activado para que la tarea nueva vacíe lo que ya esté en
+    # _pending, y la bandera se baja: un despertar programado en un loop anterior
+    # (cerrado o detenido) nunca se atenderá y dejaría el reenvío bloqueado.
+    wakeup.set()
+    loop.create_task(_pump(wakeup))
+    _wakeup_pending = False
+    _pump_target = (loop, wakeup)
+
+
+async def _pump(wakeup):
+    """Envía al grupo "mqtt_logs" los mensajes pendientes, en lotes de ≤ 30 por segundo."""
+    global _wakeup_pending
+    # El channel layer se obtiene una sola vez, al arrancar la tarea, y se reutiliza
+    # para todos los lotes (on_message ya no lo consulta por cada mensaje).
+    channel_layer = get_channel_layer()
+    while True:
+        await wakeup.wait()
+        wakeup.clear()
+        # Se baja la bandera antes de vaciar _pending: un mensaje que llegue
+        # mientras tanto se procesa en este ciclo o programa un despertar nuevo.
+        _wakeup_pending = False
+        messages = [_pending.popleft() for _ in range(len(_pending))]
+        if not messages:
+            continue
+        _EVENT["messages"] = messages
+        try:
+            await channel_layer.group_send("mqtt_logs", _EVENT)
+        except Exception as e:
+            print(f"[ERROR MQTT] No se pudieron reenviar {len(messages)} mensajes a Channels: {e}")
+
+        # Lo que llegue durante la pausa se acumula y sale en el siguiente lote
+        await asyncio.sleep(FLUSH_INTERVAL)
+
 
 
 # ---------------------------------------------------------------
@@ -90,6 +197,47 @@ def on_connect(client, userdata, flags, rc):
         print(f"[MQTT]  Error de conexión con código {rc}")
 
 
+# ---------------------------------------------------------------
+# Paquete MoCap binario → mismo JSON que publica el formato "json"
+# ---------------------------------------------------------------
+def _mocap_binary_to_json(data):
+    """
+    Convierte un paquete de MOCAP_BINARY_TOPIC al JSON de siempre, para que
+    consumers.py y el frontend lo muestren igual que los paquetes de mocap/all.
+    El checksum (últimos 4 bytes) se muestra como 8 caracteres hexadecimales y
+    cks_ok indica si coincide con el CRC-32 recalculado.
+    """
+    body, cks = data[:MOCAP_BODY.size], data[MOCAP_BODY.size:]
+    src, pts, ptp, pid, psb, x, y, z, qx, qy, qz, qw = MOCAP_BODY.unpack(body)
+    return orjson.dumps({
+        "src": src, "pts": pts, "ptp": ptp, "pid": pid, "psb": psb,
+        "pld": {"pose": {
+            "position": {"x": x, "y": y, "z": z},
+            "rotation": {"qx": qx, "qy": qy, "qz": qz, "qw": qw},
+        }},
+        "cks": f"{int.from_bytes(cks, 'little'):08x}",
+        "cks_ok": int.from_bytes(cks, "little") == zlib.crc32(body),
+    }).decode()
+
+
+# ---------------------------------------------------------------
+# Callback al abrir el socket (también en cada reconexión)
+# ---------------------------------------------------------------
+def on_socket_open(client, userdata, sock):
+    """
+    Amplía el buffer de envío TCP para absorber ráfagas de publicaciones y
+    desactiva Nagle (TCP_NODELAY) para que los paquetes pequeños salgan sin espera.
+    """
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SNDBUF)
+    except OSError as e:
+        print(f"[MQTT]  No se pudo ajustar SO_SNDBUF: {e}")
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError as e:
+        print(f"[MQTT]  No se pudo activar TCP_NODELAY: {e}")
+
+
 # ---------------------------------------------------------------
 # Callback al recibir un mensaje MQTT
 # ---------------------------------------------------------------
@@ -107,42 +255,51 @@ def on_message(client, userdata, msg):
       - userdata: datos de usuario.
       - msg: objeto con los campos `topic`, `payload`, `qos`, etc.
     """
+    global _wakeup_pending, _last_topic
     try:
-        # Decodificar el payload (bytes → string legible1)
-        payload = msg.payload.decode("utf-8")
+        # Decodificar el payload (bytes → string legible1); los paquetes MoCap
+        # binarios se convierten al mismo JSON que los de mocap/all
+        if msg.topic == MOCAP_BINARY_TOPIC:
+            payload = _mocap_binary_to_json(msg.payload)
+        else:
+            payload = msg.payload.decode("utf-8")
 
         # Registrar el tópico detectado (para monitoreo)
-        detected_topics.add(msg.topic)
+        # (solo si cambió respecto al anterior: el MoCap repite el mismo tópico
+        # en casi todos los mensajes y así se evita el hash + búsqueda en el set)
+        topic = msg.topic
+        if topic != _last_topic:
+            detected_topics.add(topic)
+            _last_topic = topic
 
          # ----------------------------------------------------------
         # Enviar el mensaje recibido al grupo WebSocket "mqtt_logs"
         # ----------------------------------------------------------
-        #  - type: tipo de evento que manejará consumers.py (mqtt_message)
-        #  - topic: tópico original del mensaje
-        #  - payload: contenido del mensaje
-        
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "mqtt_logs",
-            {
-                "type": "mqtt_message",  # Nombre del evento manejado por consumers.py
-                "topic": msg.topic,
-                "payload": payload,
-            },
-        )
-
-        # Mostrar por consola según el tipo de mensaje
-        if msg.topic.startswith("mocap/"):
-            print(f"[MQTT] MoCap → {msg.topic}: {payload[:120]}...")
-        elif msg.topic == TELEMETRY_TOPIC:
-            print(f"[MQTT]  Telemetría Pololu → {payload[:120]}...")
-    
-
-        else:
-            print(f"[MQTT]  Otro mensaje → {msg.topic}: {payload[:120]}")
-
-        # Delay breve para evitar saturación del hilo
-        time.sleep(0.1)
+        # Solo se agrega a _pending; _pump (en el loop ASGI) hace el group_send.
+        # El loop se despierta únicamente si no hay ya un despertar programado.
+        # Sin clientes conectados aún, el mensaje no tiene destinatarios y se omite.
+        target = _pump_target
+        if target is not None:
+            _pending.append((msg.topic, payload))
+            if not _wakeup_pending:
+                _wakeup_pending = True
+                loop, wakeup = target
+                try:
+                    loop.call_soon_threadsafe(wakeup.set)
+                except RuntimeError as e:
+                    # Loop cerrado: sin bajar la bandera, ningún mensaje posterior
+                    # volvería a intentar despertar a _pump
+                    _wakeup_pending = False
+                    print(f"[ERROR MQTT] No se pudo despertar el reenvío a Channels: {e}")
+
+        # Registrar según el tipo de mensaje (solo con el logger en nivel DEBUG)
+        if logger.isEnabledFor(logging.DEBUG):
+            if topic.startswith("mocap/"):
+                logger.debug("[MQTT] MoCap → %s: %.120s...", topic, payload)
+            elif topic == TELEMETRY_TOPIC:
+                logger.debug("[MQTT]  Telemetría Pololu → %.120s...", payload)
+            else:
+                logger.debug("[MQTT]  Otro mensaje → %s: %.120s", topic, payload)
 
     except Exception as e:
         print(f"[ERROR MQTT] No se pudo procesar mensaje: {e}")
@@ -164,13 +321,15 @@ def publish_command(packet: dict):
         return
 
     try:
-        # Convertir el diccionario Python a cadena JSON
-        message = json.dumps(packet)
+        # Convertir el diccionario Python a JSON (bytes, listos para el payload)
+        message = orjson.dumps(packet)
 
-        # Publicar el comando en el tópico del Pololu
+        # Publicar el comando en el tópico del Pololu. El cliente ya está conectado y
+        # su hilo de red (loop_start) hace el envío: publish() solo encola el paquete
+        # y regresa de inmediato, sin bloquear la vista que lo llamó.
         mqtt_client_instance.publish(COMMAND_TOPIC, message, qos=0)
 
-        print(f"[MQTT]  Comando publicado en {COMMAND_TOPIC}: {message}")
+        print(f"[MQTT]  Comando publicado en {COMMAND_TOPIC}: {message.decode()}")
 
     except Exception as e:
         print(f"[ERROR MQTT] No se pudo publicar comando: {e}")
@@ -185,23 +344,39 @@ def start_mqtt_client():
     - Crea la instancia del cliente.
     - Asigna los callbacks de conexión y mensaje.
     - Establece la conexión con el broker.
-    - Lanza un hilo con `loop_forever()` para mantener la comunicación activa.
+    - Lanza el hilo de red de Paho con `loop_start()` para mantener la comunicación activa.
     """
     global mqtt_client_instance
 
-    # Crear la instancia del cliente MQTT
-    mqtt_client_instance = mqtt.Client()
+    # Crear la instancia del cliente MQTT.
+    # clean_session=True: todo va con QoS 0 (el broker no guardaría mensajes para
+    # la sesión) y on_connect vuelve a suscribirse en cada reconexión; además el
+    # client_id cambia con el PID y una sesión persistente quedaría huérfana.
+    mqtt_client_instance = mqtt.Client(client_id=CLIENT_ID, clean_session=True)
 
     # Asignar las funciones de callback
     mqtt_client_instance.on_connect = on_connect
     mqtt_client_instance.on_message = on_message
+    mqtt_client_instance.on_socket_open = on_socket_open
+
+    # Límites de la cola de salida: publish() desde cualquier hilo solo encola,
+    # y el hilo de red de Paho es el único que escribe en el socket.
+    # (Todo se publica con QoS 0; MAX_INFLIGHT solo aplica a QoS > 0.)
+    mqtt_client_instance.max_inflight_messages_set(MAX_INFLIGHT)
+    mqtt_client_instance.max_queued_messages_set(MAX_QUEUED)
+
+    # Espera exponencial entre reintentos (1 s, 2 s, 4 s … hasta 30 s) para no
+    # saturar al broker con reconexiones si la red se cae
+    mqtt_client_instance.reconnect_delay_set(min_delay=RECONNECT_MIN_DELAY,
+                                             max_delay=RECONNECT_MAX_DELAY)
 
     # Conectarse al broker
     mqtt_client_instance.connect(BROKER, PORT, keepalive=60)
 
-    # Iniciar el loop MQTT en segundo plano (no bloquea el servidor Django)
-    thread = threading.Thread(target=mqtt_client_instance.loop_forever, daemon=True)
-    thread.start()
+    # Iniciar el loop MQTT en segundo plano (no bloquea el servidor Django).
+    # loop_start() crea el hilo de red propio de Paho, que atiende tanto la recepción
+    # como la cola de publicaciones de publish_command().
+    mqtt_client_instance.loop_start()
 
     print("[MQTT]  Cliente MQTT iniciado correctamente.")
     print(f"[MQTT]  Escuchando: {TOPIC} y {TELEMETRY_TOPIC}")
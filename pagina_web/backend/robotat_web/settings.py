@@ -29,6 +29,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 # =========================
 # Importaciones de utilería
 # =========================
+import os                                               # Variables de entorno (ajustes por despliegue)
 from pathlib import Path                               # Módulo para construir rutas independientes del sistema operativo
 from datetime import timedelta                         # Clase para definir intervalos de tiempo (usada en JWT)
 
@@ -143,6 +144,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',          # Usa SQLite en desarrollo (archivo físico local)
         'NAME': BASE_DIR / 'db.sqlite3',                 # Ruta del archivo de base de datos
+        # Conexiones persistentes: se reutilizan entre peticiones en lugar de abrir
+        # y cerrar una por petición (en PostgreSQL eso cuesta TCP + autenticación).
+        # El proceso ASGI (Channels) debe usar DB_CONN_MAX_AGE=0: allí cada petición
+        # síncrona corre en hilos del executor y las conexiones no se reciclan igual.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,                      # Verifica la conexión reutilizada antes de usarla
     }
 }
 
@@ -157,6 +164,19 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},          # Evita contraseñas solo numéricas
 ]
 
+# Argon2id primero: es el hasher que se usa para contraseñas nuevas. Cuesta mucho menos
+# CPU por verificación que PBKDF2 (600k iteraciones) y al ser "memory-hard" resiste
+# mejor ataques con GPU. Los hashes PBKDF2 existentes siguen validando y Django los
+# re-hashea con Argon2 automáticamente en el siguiente login exitoso.
+# Se usa una subclase con parámetros ajustados (ver interfaz/hashers.py).
+# Requiere el paquete argon2-cffi (requirements.txt).
+PASSWORD_HASHERS = [
+    'interfaz.hashers.TunedArgon2PasswordHasher',             # Hasher por defecto (nuevos hashes)
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',       # Hashes existentes
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 
 # =================
 # Internacionalización
@@ -203,7 +223,7 @@ CSRF_TRUSTED_ORIGINS = [
 # =================
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  # Autenticación principal por JWT
+        'interfaz.authentication.CachedJWTAuthentication',  # JWT con caché del usuario (ver interfaz/authentication.py)
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',          # Permisos abiertos por defecto (restringidos por vista)
@@ -253,3 +273,12 @@ CHANNEL_LAYERS = {
         'BACKEND': 'channels.layers.InMemoryChannelLayer',  # Comunicación asíncrona local en memoria
     },
 }
+
+
+# =================
+# Cámaras IP (Amcrest)
+# =================
+CAM_CONNECT_TIMEOUT = 0.3                             # Segundos para abrir la conexión TCP (cámaras en la LAN)
+CAM_READ_TIMEOUT = 1.0                                # Segundos máximos esperando la respuesta HTTP
+CAM_STATUS_INTERVAL = 2.0                             # Segundos entre consultas del flujo de estado (SSE)
+CAM_STATUS_TTL = 2.0                                  # Segundos que se reutiliza el último estado de cada cámara
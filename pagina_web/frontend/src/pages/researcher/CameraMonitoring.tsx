@@ -64,25 +64,28 @@ export function CameraMonitoring() {
   const [fullscreenCamera, setFullscreenCamera] = useState<string | null>(null);
 
   // --------------------------------------------
-  // Consultar estado online/offline de cámaras
+  // Estado online/offline de cámaras en vivo (Server-Sent Events)
+  // El backend consulta las cámaras con un solo bucle y solo envía
+  // los cambios de estado: no hay polling desde el navegador.
   // --------------------------------------------
-  const checkCameraStatus = async (id: string) => {
-    try {
-      const res = await fetch(`${API_BASE}/api/cameras/${id}/status/`);
-      const data = await res.json();
-      const newStatus: 'online' | 'offline' = data?.online ? 'online' : 'offline';
-      setCameras((prev) => prev.map((c) => (c.id === id ? { ...c, status: newStatus } : c)));
-    } catch {
-      setCameras((prev) => prev.map((c) => (c.id === id ? { ...c, status: 'offline' } : c)));
-    }
-  };
-
   useEffect(() => {
-    cameras.filter((c) => c.enabled).forEach((c) => checkCameraStatus(c.id));
-    const iv = setInterval(() => {
-      cameras.filter((c) => c.enabled).forEach((c) => checkCameraStatus(c.id));
-    }, 15000);
-    return () => clearInterval(iv);
+    const source = new EventSource(`${API_BASE}/api/cameras/status/stream/`);
+
+    source.onmessage = (ev) => {
+      const { id, online } = JSON.parse(ev.data) as { id: string; online: boolean };
+      const newStatus: 'online' | 'offline' = online ? 'online' : 'offline';
+      setCameras((prev) =>
+        prev.map((c) => (c.enabled && c.id === id ? { ...c, status: newStatus } : c))
+      );
+    };
+
+    // Si se pierde la conexión se marcan offline; EventSource reconecta solo
+    // y al reconectar el backend reenvía el estado actual de cada cámara.
+    source.onerror = () => {
+      setCameras((prev) => prev.map((c) => (c.enabled ? { ...c, status: 'offline' } : c)));
+    };
+
+    return () => source.close();
   }, []);
 
   // --------------------------------------------
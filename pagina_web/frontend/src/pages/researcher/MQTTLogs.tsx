@@ -162,51 +162,65 @@ useEffect(() => {
           return;
         }
 
-            // Mensaje MQTT real recibido
-    if (data.type === "mqtt_message") {
-      // ---------------------------------------------------------------
-      // Construimos el objeto 'message' con los datos entrantes
-      // ---------------------------------------------------------------
-      const message: MqttMessage = {
-        id: Date.now().toString(),                         //  id único basado en timestamp
-        timestamp: new Date().toLocaleTimeString(),        // hora local legible
-        topic: data.topic,                                 //  topic completo recibido
-        agent: data.topic.split("/")[1] || "unknown",      //  agente deducido por convención 'mocap/<agent>/...'
-        type: data.topic.includes("control") ? "control" : "telemetry", //  clasifica por nombre del topic
-        packet: data.packet,                               //  el contenido del paquete (ya estandarizado como 'packet')
-      };
+            // Mensaje MQTT real recibido (uno suelto o un lote "mqtt_batch")
+    if (data.type === "mqtt_message" || data.type === "mqtt_batch") {
+      // El backend agrupa los paquetes que llegan en la misma ventana (~20 ms)
+      // en un solo frame: { type: "mqtt_batch", packets: [ {topic, packet}, ... ] }
+      const items = data.type === "mqtt_batch" ? data.packets : [data];
 
       // ---------------------------------------------------------------
-      // FILTRO EN FRONTEND: solo pasar si el topic está suscrito
+      //  Si está pausado, NO almacenar los mensajes
+      //     * OJO: usar 'isPausedRef' para leer el estado actual
       // ---------------------------------------------------------------
-      const isSubscribedToTopic = subscriptionsRef.current.some((sub) => {
-        // 1) Si no está marcada la suscripción, ignorar
-        if (!sub.isSubscribed) return false;
+      if (isPausedRef.current) {
+        return; // Descartar todo el frame
+      }
 
-        // 2) Coincidencia exacta del topic
-        if (sub.topic === message.topic) return true;
+      const now = Date.now();
+      const accepted: MqttMessage[] = [];
+
+      items.forEach((item: { topic: string; packet: MqttMessage["packet"] }, index: number) => {
+        // ---------------------------------------------------------------
+        // Construimos el objeto 'message' con los datos entrantes
+        // ---------------------------------------------------------------
+        const message: MqttMessage = {
+          id: `${now}-${index}`,                             //  id único: timestamp + posición en el lote
+          timestamp: new Date(now).toLocaleTimeString(),     // hora local legible
+          topic: item.topic,                                 //  topic completo recibido
+          agent: item.topic.split("/")[1] || "unknown",      //  agente deducido por convención 'mocap/<agent>/...'
+          type: item.topic.includes("control") ? "control" : "telemetry", //  clasifica por nombre del topic
+          packet: item.packet,                               //  el contenido del paquete (ya estandarizado como 'packet')
+        };
+
+        // ---------------------------------------------------------------
+        // FILTRO EN FRONTEND: solo pasar si el topic está suscrito
+        // ---------------------------------------------------------------
+        const isSubscribedToTopic = subscriptionsRef.current.some((sub) => {
+          // 1) Si no está marcada la suscripción, ignorar
+          if (!sub.isSubscribed) return false;
+
+          // 2) Coincidencia exacta del topic
+          if (sub.topic === message.topic) return true;
+
+          // 3) Soporte básico para wildcard estilo MQTT: 'algo/#'
+          if (sub.topic.endsWith("/#")) {
+            const prefix = sub.topic.slice(0, -2); // ← remueve '/#'
+            return message.topic.startsWith(prefix);
+          }
 
-        // 3) Soporte básico para wildcard estilo MQTT: 'algo/#'
-        if (sub.topic.endsWith("/#")) {
-          const prefix = sub.topic.slice(0, -2); // ← remueve '/#'
-          return message.topic.startsWith(prefix);
-        }
+          return false; // no coincide
+        });
 
-        return false; // no coincide
+        if (isSubscribedToTopic) accepted.push(message);
       });
 
       // ---------------------------------------------------------------
-      //  Si no está suscrito o está pausado, NO almacenar el mensaje
-      //     * OJO: usarisPausedRef' para leer el estado actual
-      // ---------------------------------------------------------------
-      if (!isSubscribedToTopic || isPausedRef.current) {
-        return; // No guardar el mensaje, descartarlo
-      }
-
-      // ---------------------------------------------------------------
-      //  Si pasa el filtro, guardar mensaje (máximo 1000)
+      //  Guardar los mensajes que pasaron el filtro (máximo 1000), con una
+      //  sola actualización de estado por frame. Los más recientes van primero.
       // ---------------------------------------------------------------
-      setMessages((prev) => [message, ...prev].slice(0, 1000));
+      if (accepted.length === 0) return;
+      accepted.reverse();
+      setMessages((prev) => [...accepted, ...prev].slice(0, 1000));
     }
 
 